@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Compares rows/sec of the original split-based relations parsing loop with
+vwcsvutils.read_relations on a generated relations file.
+
+    (venv) $ python benchmarks/bench_csv_parse.py --rows 1000000
+"""
+
+import click
+import os
+import random
+import tempfile
+import time
+from vwimporttools.vwcsvutils import read_relations
+
+
+def generate_relations(path, rows, seed=0):
+    rnd = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(rows):
+            kind = rnd.choice(('hba', 'host', 'application'))
+            tags = ';'.join('tag{}'.format(rnd.randrange(50)) for _ in range(rnd.randrange(4)))
+            members = ','.join('{}{}_{}'.format(kind, i, m) for m in range(rnd.randrange(1, 5)))
+            f.write('{},{}{},{},{}\n'.format(kind, kind, i, tags, members))
+
+
+def legacy_relations(csv_in):
+    for line in csv_in:
+        if line.count(',') < 2:
+            continue
+        etype = line.split(',')[0].strip().replace("'", '').replace('"', '')
+        name = line.split(',')[1].strip().replace("'", '').replace('"', '')
+        tag_line = line.replace("'", '').replace('"', '').split(',')[2].split(';')
+        if tag_line[0] == '':
+            tags = []
+        else:
+            tags = tag_line
+        members = []
+        for member in line.replace("'", '').replace('"', '').split(',')[3:]:
+            members.append(member.strip())
+        yield etype, name, tags, members
+
+
+def run(parser, path):
+    start = time.perf_counter()
+    with open(path, newline='') as f:
+        rows = sum(1 for _ in parser(f))
+    return rows, time.perf_counter() - start
+
+
+@click.command()
+@click.option('--rows', default=1000000, show_default=True)
+@click.option('--repeat', default=3, show_default=True)
+def main(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'relations.csv')
+        generate_relations(path, rows)
+        for label, parser in (('split (before)', legacy_relations), ('read_relations (after)', read_relations)):
+            best = min(run(parser, path)[1] for _ in range(repeat))
+            click.echo('{:<24} {:>12,.0f} rows/sec'.format(label, rows / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Compares the memory held by N entities built with the former per-module
+converter classes (plain classes with a __dict__) and with the __slots__
+classes in vwentities, and the time to serialize them.
+
+    (venv) $ python benchmarks/bench_entity_memory.py --entities 1000000
+"""
+
+import click
+import time
+import tracemalloc
+from vwimporttools.vwentities import alias_entity, relation_entity
+from vwimporttools.vwjsonutils import EntityWriter
+
+
+class LegacyAlias:
+    def __init__(self, name, wwn, etype):
+        self.new_name = name
+        self.wwn = wwn
+        self.type = etype
+
+
+class LegacyEntity:
+    def __init__(self, name, etype, tags, child_entities):
+        self.name = name
+        self.type = etype
+        self.tags = tags
+        self.child_entities = {"add": child_entities}
+
+
+class LegacyApplication:
+    def __init__(self, name, etype, tags, initiator_list):
+        self.name = name
+        self.type = etype
+        self.tags = tags
+        self.itl_patterns = []
+        self.devices = {'add' : []}
+        for i in initiator_list:
+            if i.count(":") == 2:
+                self.itl_patterns.append({"edit_type": "add", "initiator": i.split(":")[0], "target": i.split(":")[1], "lun": i.split(":")[2]})
+            elif i.count(":") == 1:
+                self.itl_patterns.append({"edit_type": "add", "initiator": i.split(":")[0], "target": i.split(":")[1] })
+            else:
+                self.devices['add'].append(i)
+        if len(self.itl_patterns) < 1:
+            del(self.itl_patterns)
+        if len(self.devices['add']) < 1:
+            del(self.devices)
+
+
+def build(count, alias, relation, application):
+    entities = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            entities.append(alias('alias{}'.format(i), '{:016x}'.format(i), 'hostport'))
+        elif kind == 3:
+            entities.append(application('app{}'.format(i), 'application', [], ['i{}:t{}:{}'.format(i, i, i % 8), 'dev{}'.format(i)]))
+        else:
+            entities.append(relation('{}{}'.format('hba' if kind == 1 else 'host', i), 'hba' if kind == 1 else 'host',
+                                     ['tag{}'.format(i % 50)], ['m{}'.format(i)]))
+    return entities
+
+
+def measure(count, *classes):
+    tracemalloc.start()
+    entities = build(count, *classes)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    out = open('/dev/null', 'w')
+    with EntityWriter(out, indent=None) as writer:
+        for entity in entities:
+            writer.write(entity)
+    return size, time.perf_counter() - start
+
+
+@click.command()
+@click.option('--entities', default=1000000, show_default=True)
+def main(entities):
+    legacy = measure(entities, LegacyAlias, LegacyEntity, LegacyApplication)
+    slots = measure(entities, alias_entity, lambda n, t, g, m: relation_entity(t, n, g, m),
+                    lambda n, t, g, m: relation_entity(t, n, g, m))
+    click.echo('{:<22} {:>10} {:>14}'.format('', 'MB held', 'serialize (s)'))
+    click.echo('{:<22} {:>10.1f} {:>14.2f}'.format('__dict__ (before)', legacy[0] / 2 ** 20, legacy[1]))
+    click.echo('{:<22} {:>10.1f} {:>14.2f}'.format('__slots__ (after)', slots[0] / 2 ** 20, slots[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Generates a seeded synthetic SAN fabric as converter input: an aliases CSV
+(WWN,nickname for every host and storage port) and a relations CSV (hbas
+with their ports, hosts with their hbas, applications with their hosts and
+initiator:target:lun patterns). The same seed and sizes always give the
+same files.
+
+    (venv) $ python benchmarks/bench_fabric.py --entities 1000000 /tmp/fabric
+
+Sizes can be given directly (--hosts, --hbas-per-host, ...) or derived
+from a target entity count with --entities.
+"""
+
+import click
+import os
+import random
+
+# aliases + relation rows generated per host with the default sizes: 4 host
+# ports, a quarter of a storage port, 2 hba rows, 1 host row and a tenth of
+# an application
+ENTITIES_PER_HOST = 7.35
+
+
+def wwn(prefix, number):
+    return '{:04x}{:012x}'.format(prefix, number)
+
+
+class Fabric:
+    def __init__(self, hosts, hbas_per_host=2, ports_per_hba=2, storage_ports=None, hosts_per_app=10,
+                 itl_per_host=4, luns=16, tags=50, seed=0):
+        self.hosts = hosts
+        self.hbas_per_host = hbas_per_host
+        self.ports_per_hba = ports_per_hba
+        self.storage_ports = storage_ports or max(4, hosts // 4)
+        self.hosts_per_app = hosts_per_app
+        self.itl_per_host = itl_per_host
+        self.luns = luns
+        self.tags = tags
+        self.seed = seed
+
+    @classmethod
+    def for_entities(cls, entities, seed=0):
+        return cls(max(1, int(entities / ENTITIES_PER_HOST)), seed=seed)
+
+    def host_port(self, host, hba, port):
+        number = (host * self.hbas_per_host + hba) * self.ports_per_hba + port
+        return wwn(0x1000, number), 'host{}_hba{}_p{}'.format(host, hba, port)
+
+    def storage_port(self, number):
+        return wwn(0x5000, number), 'array{}_p{}'.format(number // 8, number % 8)
+
+    def _tags(self, rnd):
+        return ';'.join('tag{}'.format(rnd.randrange(self.tags)) for _ in range(rnd.randrange(4)))
+
+    def write_aliases(self, path):
+        rows = 0
+        with open(path, 'w') as f:
+            for host in range(self.hosts):
+                for hba in range(self.hbas_per_host):
+                    for port in range(self.ports_per_hba):
+                        f.write('{},{}\n'.format(*self.host_port(host, hba, port)))
+                        rows += 1
+            for number in range(self.storage_ports):
+                f.write('{},{}\n'.format(*self.storage_port(number)))
+                rows += 1
+        return rows
+
+    def write_relations(self, path):
+        rnd = random.Random(self.seed)
+        rows = 0
+        with open(path, 'w') as f:
+            for host in range(self.hosts):
+                hbas = []
+                for hba in range(self.hbas_per_host):
+                    name = 'host{}_hba{}'.format(host, hba)
+                    ports = [self.host_port(host, hba, port)[1] for port in range(self.ports_per_hba)]
+                    f.write('hba,{},{},{}\n'.format(name, self._tags(rnd), ','.join(ports)))
+                    hbas.append(name)
+                f.write('host,host{},{},{}\n'.format(host, self._tags(rnd), ','.join(hbas)))
+                rows += len(hbas) + 1
+
+            for first in range(0, self.hosts, self.hosts_per_app):
+                members = []
+                for host in range(first, min(first + self.hosts_per_app, self.hosts)):
+                    members.append('host{}'.format(host))
+                    for _ in range(self.itl_per_host):
+                        initiator = self.host_port(host, rnd.randrange(self.hbas_per_host),
+                                                   rnd.randrange(self.ports_per_hba))[0]
+                        target = self.storage_port(rnd.randrange(self.storage_ports))[0]
+                        if rnd.random() < 0.25:
+                            members.append('{}:{}'.format(initiator, target))
+                        else:
+                            members.append('{}:{}:{}'.format(initiator, target, rnd.randrange(self.luns)))
+                f.write('application,app{},{},{}\n'.format(first // self.hosts_per_app, self._tags(rnd),
+                                                             ','.join(members)))
+                rows += 1
+        return rows
+
+    def write(self, directory):
+        """
+        Writes aliases.csv and relations.csv to directory and returns their
+        paths and row counts.
+        """
+        os.makedirs(directory, exist_ok=True)
+        aliases = os.path.join(directory, 'aliases.csv')
+        relations = os.path.join(directory, 'relations.csv')
+        return {'aliases': aliases, 'alias_rows': self.write_aliases(aliases),
+                'relations': relations, 'relation_rows': self.write_relations(relations)}
+
+
+@click.command()
+@click.option('--entities', '-n', type=int, help='Size the fabric for roughly N aliases and relations')
+@click.option('--hosts', type=int, default=1000, show_default=True)
+@click.option('--hbas-per-host', type=int, default=2, show_default=True)
+@click.option('--ports-per-hba', type=int, default=2, show_default=True)
+@click.option('--hosts-per-app', type=int, default=10, show_default=True)
+@click.option('--itl-per-host', type=int, default=4, show_default=True)
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.argument('directory')
+def main(entities, hosts, hbas_per_host, ports_per_hba, hosts_per_app, itl_per_host, seed, directory):
+    if entities:
+        fabric = Fabric.for_entities(entities, seed)
+    else:
+        fabric = Fabric(hosts, hbas_per_host, ports_per_hba, hosts_per_app=hosts_per_app,
+                        itl_per_host=itl_per_host, seed=seed)
+    result = fabric.write(directory)
+    click.echo('{aliases}: {alias_rows} rows\n{relations}: {relation_rows} rows'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
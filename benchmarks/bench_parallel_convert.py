@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Measures vw_csv_relations_to_json wall time for --jobs 1 and the given job
+counts on the relations file of a generated fabric (see bench_fabric.py),
+and checks that every run produces output identical to the serial one.
+
+    (venv) $ python benchmarks/bench_parallel_convert.py --rows 1000000 --jobs 2 --jobs 4
+"""
+
+import click
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bench_fabric import Fabric
+
+# relations rows per host of a default Fabric: 2 hbas, the host and a tenth
+# of an application
+ROWS_PER_HOST = 3.1
+
+
+def convert(csv_path, json_path, jobs):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'vwimporttools.vw_csv_relations_to_json', '--jobs', str(jobs),
+                    csv_path, json_path], check=True)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--rows', default=1000000, show_default=True)
+@click.option('--jobs', '-j', multiple=True, type=int, default=(2, 4), show_default=True)
+def main(rows, jobs):
+    click.echo('{} CPUs available'.format(os.cpu_count()))
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'relations.csv')
+        rows = Fabric(max(1, int(rows / ROWS_PER_HOST))).write_relations(csv_path)
+        click.echo('{} relations rows'.format(rows))
+        serial_path = os.path.join(tmp, 'serial.json')
+        serial = convert(csv_path, serial_path, 1)
+        click.echo('--jobs 1: {:8.2f} s'.format(serial))
+        for n in jobs:
+            json_path = os.path.join(tmp, 'jobs{}.json'.format(n))
+            elapsed = convert(csv_path, json_path, n)
+            same = filecmp.cmp(serial_path, json_path, shallow=False)
+            click.echo('--jobs {}: {:8.2f} s  speedup {:.2f}x  {}'.format(
+                n, elapsed, serial / elapsed, 'identical' if same else 'OUTPUT DIFFERS'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Measures the startup cost of every command: the median wall time of
+running it with --help, the import time of its module as reported by
+python -X importtime, and whether importing it loads requests or
+multiprocessing.
+
+    (venv) $ python benchmarks/bench_startup.py --runs 20
+"""
+
+import click
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = ('vw_csv_nicknames_to_json', 'vw_csv_relations_to_json', 'vw_import_entities', 'vw_export_data',
+            'vw_import')
+
+HEAVY_MODULES = ('requests', 'urllib3', 'multiprocessing', 'sqlite3')
+
+
+def median_time(args, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def import_time(module):
+    """
+    Returns the cumulative import time of the module in seconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import vwimporttools.' + module],
+                            check=True, stderr=subprocess.PIPE, text=True)
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'vwimporttools.' + module:
+            return int(fields[1]) / 1e6
+    return None
+
+
+def loaded_modules(module):
+    code = 'import sys, vwimporttools.{}; print(" ".join(m for m in {!r} if m in sys.modules))'.format(
+        module, HEAVY_MODULES)
+    return subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+                          text=True).stdout.split()
+
+
+@click.command()
+@click.option('--runs', '-n', default=10, show_default=True, help='Runs per command for the --help timing')
+def main(runs):
+    baseline = median_time(['-c', 'pass'], runs)
+    click.echo('python -c pass: {:.1f} ms'.format(baseline * 1000))
+    click.echo('{:<26} {:>10} {:>10}  {}'.format('command', '--help ms', 'import ms', 'loads'))
+    for module in COMMANDS:
+        seconds = median_time(['-m', 'vwimporttools.' + module, '--help'], runs)
+        imported = import_time(module)
+        click.echo('{:<26} {:>10.1f} {:>10.1f}  {}'.format(module, seconds * 1000,
+                                                             imported * 1000 if imported is not None else float('nan'),
+                                                             ' '.join(loaded_modules(module)) or '-'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Compares time and peak traced memory of process_topxtrend_data (nested
+dicts) with process_topxtrend_columns (arrays) on synthetic topxtrend
+results, and of merging several metrics on (entity, timestamp).
+
+    (venv) $ python benchmarks/bench_trend_columns.py --entities 50000 --samples 1440
+"""
+
+import click
+import time
+import tracemalloc
+from vwimporttools.vwtokenutils import VWtokenutils, merge_trend_columns
+
+
+def generate_results(entities, samples, offset=0):
+    return [{'entityName': 'port{}'.format(e),
+             'data': [[1600000000000 + s * 60000, float(e + s + offset)] for s in range(samples)]}
+            for e in range(entities)]
+
+
+def measure(func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    # timed separately, since tracing slows allocation-heavy code down
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+@click.command()
+@click.option('--entities', default=5000, show_default=True)
+@click.option('--samples', default=1440, show_default=True)
+@click.option('--metrics', default=3, show_default=True)
+def main(entities, samples, metrics):
+    results = {'metric{}'.format(m): generate_results(entities, samples, m) for m in range(metrics)}
+
+    def nested():
+        entity_metrics = {}
+        for metric, data in results.items():
+            VWtokenutils.process_topxtrend_data(entity_metrics, data, metric, 'port')
+        return entity_metrics
+
+    def columnar():
+        entity_metrics = {}
+        for metric, data in results.items():
+            VWtokenutils.process_topxtrend_columns(entity_metrics, data, metric, 'port')
+        return entity_metrics
+
+    click.echo('{} entities x {} samples x {} metrics'.format(entities, samples, metrics))
+    for label, func in (('nested dicts (before)', nested), ('columnar (after)', columnar)):
+        result, elapsed, peak = measure(func)
+        click.echo('{:<26} {:>8.2f} s {:>10.1f} MB peak'.format(label, elapsed, peak / 2 ** 20))
+    _, elapsed, peak = measure(lambda: merge_trend_columns(result))
+    click.echo('{:<26} {:>8.2f} s {:>10.1f} MB peak'.format('merge_trend_columns', elapsed, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Reports payload size and serialization time of an entity import document
+in the previous upload format (sort_keys=True, indent=2), the compact wire
+format, and the compact wire format gzip-compressed as VWtokenutils sends it.
+
+    (venv) $ python benchmarks/bench_wire_format.py --entities 200000
+"""
+
+import click
+import gzip
+import json
+import random
+import time
+from vwimporttools.vwjsonutils import dumps
+
+
+def generate_document(count, seed=0):
+    rnd = random.Random(seed)
+    entities = []
+    for i in range(count):
+        kind = rnd.choice(('hba', 'host', 'application'))
+        entities.append({
+            'name': '{}{}'.format(kind, i),
+            'type': kind,
+            'tags': ['tag{}'.format(rnd.randrange(50)) for _ in range(rnd.randrange(4))],
+            'child_entities': {'add': ['{}{}_{}'.format(kind, i, m) for m in range(rnd.randrange(1, 5))]},
+        })
+    return {'version': 2, 'entities': entities}
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+@click.command()
+@click.option('--entities', default=200000, show_default=True)
+def main(entities):
+    document = generate_document(entities)
+    legacy, legacy_time = timed(lambda: json.dumps(document, sort_keys=True, indent=2).encode('utf-8'))
+    compact, compact_time = timed(lambda: dumps(document).encode('utf-8'))
+    zipped, zip_time = timed(lambda: gzip.compress(compact, compresslevel=6))
+    click.echo('{:<28} {:>14} {:>10}'.format('format', 'bytes', 'seconds'))
+    click.echo('{:<28} {:>14,} {:>10.3f}'.format('indent=2, sort_keys (before)', len(legacy), legacy_time))
+    click.echo('{:<28} {:>14,} {:>10.3f}'.format('compact', len(compact), compact_time))
+    click.echo('{:<28} {:>14,} {:>10.3f}'.format('compact + gzip', len(zipped), compact_time + zip_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+"""
+A local stand-in for the VirtualWisdom REST API, for benchmarking the
+import tools without an appliance. It serves HTTPS (VWtokenutils always
+uses https://) with a self-signed certificate and implements:
+
+    POST   /api/v1/entitiesimport/start      validates the JSON, returns a transactionId
+    PUT    /api/v1/entitiesimport/commit
+    GET    /api/v1/entitiesimport/status     Busy for --busy polls, then OK
+    DELETE /api/v1/entitiesimport/discard
+    PUT    /api/v1/reports/reportBatch       returns a report uuid
+    GET    /api/v1/reports/reportPoll        unfinished for --busy polls, then chart data
+    GET    /api/v1/entities?type=...         the entities committed so far
+
+Request bodies may be gzip-encoded and/or chunked. Every response is
+delayed by --latency seconds. Entities named --reject make the start
+request fail the way the appliance reports validation errors.
+
+    (venv) $ python benchmarks/fake_appliance.py --port 8443 --latency 0.05
+    (venv) $ vw_import_entities -h localhost:8443 -t anything entities.json
+
+FakeAppliance can also be run in-process:
+
+    with FakeAppliance(latency=0.01) as vw:
+        subprocess.run(['vw_import_entities', '-h', vw.address, '-t', 'x', 'entities.json'])
+"""
+
+import click
+import gzip
+import itertools
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_certificate(directory):
+    """
+    Creates a self-signed certificate for localhost with the openssl
+    command and returns (certfile, keyfile).
+    """
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    if not (os.path.exists(certfile) and os.path.exists(keyfile)):
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '30',
+                        '-subj', '/CN=localhost', '-keyout', keyfile, '-out', certfile],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.appliance.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def read_body(self):
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b''.join(parts)
+        else:
+            length = int(self.headers.get('content-length') or 0)
+            body = self.rfile.read(length) if length else b''
+        self.server.appliance.count('bytes_received', len(body))
+        if self.headers.get('content-encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def send(self, obj, code=200):
+        appliance = self.server.appliance
+        if appliance.latency:
+            time.sleep(appliance.latency)
+        data = json.dumps(obj).encode('utf-8')
+        self.send_response(code)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self.read_body()
+        appliance = self.server.appliance
+        appliance.count(method)
+        route = appliance.routes.get((method, url.path))
+        if route is None:
+            return self.send({'errors': [{'code': '404', 'message': 'Not found: {}'.format(url.path)}]}, 404)
+        try:
+            return self.send(route(query, body))
+        except (ValueError, KeyError) as err:
+            return self.send({'errors': [{'code': '400', 'message': str(err)}]}, 400)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class FakeAppliance:
+    def __init__(self, port=0, latency=0.0, busy=2, reject='BAD', remember=True, certfile=None, keyfile=None,
+                 verbose=False):
+        self.latency = latency
+        self.busy = busy
+        self.reject = reject
+        self.remember = remember
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.transactions = {}
+        self.reports = {}
+        self.entities = {}
+        self.ids = itertools.count(1)
+        self.routes = {
+            ('POST', '/api/v1/entitiesimport/start'): self.import_start,
+            ('PUT', '/api/v1/entitiesimport/commit'): self.import_commit,
+            ('GET', '/api/v1/entitiesimport/status'): self.import_status,
+            ('DELETE', '/api/v1/entitiesimport/discard'): self.import_discard,
+            ('PUT', '/api/v1/reports/reportBatch'): self.report_batch,
+            ('GET', '/api/v1/reports/reportPoll'): self.report_poll,
+            ('GET', '/api/v1/entities'): self.get_entities,
+        }
+        if certfile is None:
+            self._certdir = tempfile.TemporaryDirectory()
+            certfile, keyfile = make_certificate(self._certdir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self.server.daemon_threads = True
+        self.server.appliance = self
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.thread = None
+
+    @property
+    def address(self):
+        return 'localhost:{}'.format(self.server.server_address[1])
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def import_start(self, query, body):
+        document = json.loads(body)
+        entities = document['entities']
+        transactionId = next(self.ids)
+        self.count('entities_received', len(entities))
+        rejected = [e for e in entities if self.reject and self.reject in (e.get('name'), e.get('new_name'))]
+        if rejected:
+            return {'status': 'ERROR', 'error': {'message': 'Validation failed'},
+                    'result': {'transactionId': transactionId, 'entities': [
+                        {'name': e.get('name', e.get('new_name')), 'type': e.get('type'),
+                         'marker': {'message': 'Rejected entity', 'location': {'line': 1, 'column': 1}}}
+                        for e in rejected]}}
+        with self.lock:
+            self.transactions[transactionId] = {'entities': entities if self.remember else [], 'polls': 0,
+                                                'committed': False, 'count': len(entities)}
+        return {'status': 'OK', 'result': {'transactionId': transactionId}}
+
+    def import_commit(self, query, body):
+        transactionId = json.loads(body)['transactionId']
+        with self.lock:
+            self.transactions[transactionId]['committed'] = True
+        return {'status': 'OK', 'result': {}}
+
+    def import_status(self, query, body):
+        transactionId = int(query['transactionId'])
+        with self.lock:
+            transaction = self.transactions[transactionId]
+            transaction['polls'] += 1
+            if transaction['polls'] <= self.busy:
+                return {'success': False, 'status': 'Busy'}
+            if transaction['committed'] and transaction['entities'] is not None:
+                for entity in transaction['entities']:
+                    self.apply(entity)
+                transaction['entities'] = None
+                self.stats['entities_imported'] = self.stats.get('entities_imported', 0) + transaction['count']
+        return {'success': True, 'status': 'OK'}
+
+    def apply(self, entity):
+        """
+        Applies an imported entity to the stored ones: string fields are
+        set, tags replaced, and edit structures ({"add": [...], "remove":
+        [...]}) and ITL patterns ({"edit_type": ...}) applied to the
+        member lists, which are returned as plain lists of names and of
+        {"initiator", "target"[, "lun"]} dicts.
+        """
+        name = entity.get('new_name', entity.get('name'))
+        properties = self.entities.setdefault(str(entity.get('type', '')).lower(), {}).setdefault(name, {})
+        properties['name'] = name
+        for field, value in entity.items():
+            if isinstance(value, str):
+                properties[field] = value
+            elif field == 'tags':
+                properties[field] = list(value)
+            elif field == 'itl_patterns':
+                patterns = properties.setdefault(field, [])
+                for edit in value:
+                    pattern = dict((k, v) for k, v in edit.items() if k != 'edit_type')
+                    if edit.get('edit_type', 'add') == 'remove':
+                        if pattern in patterns:
+                            patterns.remove(pattern)
+                    elif pattern not in patterns:
+                        patterns.append(pattern)
+            elif isinstance(value, dict):
+                members = properties.setdefault(field, [])
+                members.extend(m for m in value.get('add', []) if m not in members)
+                members[:] = [m for m in members if m not in value.get('remove', [])]
+
+    def import_discard(self, query, body):
+        transactionId = json.loads(body)['transactionId']
+        with self.lock:
+            self.transactions.pop(transactionId, None)
+        return {'status': 'OK'}
+
+    def report_batch(self, query, body):
+        report = str(uuid.uuid4())
+        with self.lock:
+            self.reports[report] = [0, json.loads(body)]
+        return report
+
+    def report_poll(self, query, body):
+        with self.lock:
+            report = self.reports[query['uuid']]
+            report[0] += 1
+            if report[0] <= self.busy:
+                return {'finished': False}
+        payload = report[1]
+        chart = payload.get('chartType')
+        count = int(payload.get('limit', 10) or 10)
+        if chart == 'topxtrend':
+            start = int(payload.get('startTime', 0) or 0)
+            data = [{'entityName': 'entity{}'.format(i),
+                     'data': [[start + j * 60000, float(i * j)] for j in range(60)]} for i in range(count)]
+        elif chart == 'topxcard':
+            data = [{'entityName': 'entity{}'.format(i), 'entityValue': float(i)} for i in range(count)]
+        else:
+            data = [dict({'entityName': 'entity{}'.format(i)},
+                         **{k: float(i) for k in ('avg', 'min', 'max', 'median', '5th', '25th', '75th', '95th')})
+                    for i in range(count)]
+        return {'finished': True, 'charts': [{'chartData': data}]}
+
+    def get_entities(self, query, body):
+        with self.lock:
+            entities = list(self.entities.get(query.get('type', '').lower(), {}).values())
+        if query.get('filterText'):
+            entities = [e for e in entities if e['name'] == query['filterText']]
+        return [{'properties': [{'id': k, 'value': v} for k, v in e.items()]} for e in entities]
+
+
+@click.command()
+@click.option('--port', '-p', type=int, default=8443, show_default=True)
+@click.option('--latency', '-l', type=float, default=0.0, show_default=True, help='Seconds added to every response')
+@click.option('--busy', '-b', type=int, default=2, show_default=True,
+              help='Status and report polls answered as unfinished')
+@click.option('--reject', default='BAD', show_default=True, help='Entity name that fails validation')
+@click.option('--forget', is_flag=True, help='Do not keep imported entities for /entities')
+@click.option('--cert', type=click.Path(exists=True, dir_okay=False), help='PEM certificate (default: self-signed)')
+@click.option('--key', type=click.Path(exists=True, dir_okay=False), help='PEM private key for --cert')
+@click.option('--verbose', '-v', is_flag=True, help='Log every request')
+def main(port, latency, busy, reject, forget, cert, key, verbose):
+    appliance = FakeAppliance(port, latency, busy, reject, not forget, cert, key, verbose)
+    click.echo('Serving on https://{}'.format(appliance.address))
+    try:
+        appliance.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    click.echo(json.dumps(appliance.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Runs the converters and the importer end to end on generated fabrics of
+several sizes and records, for every run, wall time, throughput and the
+peak RSS of the process. The importer runs against a FakeAppliance in this
+process, so no appliance is needed. Like the other benchmarks, it needs
+the package installed (pip install -e . in the checkout).
+
+    (venv) $ python benchmarks/run_benchmarks.py --scale 10000 --scale 1000000 --output results.jsonl
+
+Results are printed as a table and, with --output, appended as JSON lines.
+With --baseline, each run is compared with the latest run of the same tool
+and scale in the baseline file, and the command exits with status 1 if the
+throughput of any run dropped by more than --tolerance.
+
+The 10M scale (--scale 10000000) needs several GB of disk for the
+generated files and takes a long time; it is not run by default.
+"""
+
+import click
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from bench_fabric import Fabric
+from fake_appliance import FakeAppliance
+
+DEFAULT_SCALES = (10000, 1000000)
+
+
+def run(args):
+    """
+    Runs a command and returns (wall seconds, peak RSS in bytes or None).
+    """
+    # stderr goes to a file rather than a pipe: the child must never block
+    # on a full pipe while wait4() waits for it to exit
+    with tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=errors)
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(proc.pid, 0)
+            elapsed = time.perf_counter() - start
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+            elapsed = time.perf_counter() - start
+            rss = None
+        errors.seek(0)
+        stderr = errors.read()
+    if proc.returncode != 0:
+        raise click.ClickException('{} failed ({}):\n{}'.format(' '.join(args[2:4]), proc.returncode,
+                                                                stderr.decode('utf-8', 'replace')[-2000:]))
+    return elapsed, rss
+
+
+def record(tool, scale, entities, nbytes, elapsed, rss, **extra):
+    result = {'tool': tool, 'scale': scale, 'entities': entities, 'seconds': round(elapsed, 3),
+              'entities_per_second': round(entities / elapsed, 1) if elapsed else None,
+              'mb_per_second': round(nbytes / elapsed / 2 ** 20, 2) if elapsed else None,
+              'peak_rss_mb': round(rss / 2 ** 20, 1) if rss else None,
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version()}
+    result.update(extra)
+    return result
+
+
+def benchmark_scale(scale, workdir, jobs, batch_size, workers, latency, skip_import):
+    results = []
+    module = [sys.executable, '-m']
+    fabric = Fabric.for_entities(scale)
+    files = fabric.write(workdir)
+    aliases_json = os.path.join(workdir, 'aliases.json')
+    relations_json = os.path.join(workdir, 'relations.json')
+
+    elapsed, rss = run(module + ['vwimporttools.vw_csv_nicknames_to_json', '-t', 'hostport', '--jobs', str(jobs),
+                                 files['aliases'], aliases_json])
+    results.append(record('vw_csv_nicknames_to_json', scale, files['alias_rows'],
+                          os.path.getsize(files['aliases']), elapsed, rss, jobs=jobs))
+
+    elapsed, rss = run(module + ['vwimporttools.vw_csv_relations_to_json', '--jobs', str(jobs),
+                                 files['relations'], relations_json])
+    results.append(record('vw_csv_relations_to_json', scale, files['relation_rows'],
+                          os.path.getsize(files['relations']), elapsed, rss, jobs=jobs))
+
+    if not skip_import:
+        with FakeAppliance(latency=latency, busy=1, remember=False) as appliance:
+            for name, path, count in (('aliases', aliases_json, files['alias_rows']),
+                                      ('relations', relations_json, files['relation_rows'])):
+                elapsed, rss = run(module + ['vwimporttools.vw_import_entities', '-h', appliance.address, '-t', 'x',
+                                             '-b', str(batch_size), '-w', str(workers), path])
+                results.append(record('vw_import_entities', scale, count, os.path.getsize(path), elapsed, rss,
+                                      input=name, batch_size=batch_size, workers=workers, latency=latency))
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Returns a list of messages for runs whose throughput is more than
+    tolerance below the latest baseline run of the same tool, input and
+    scale.
+    """
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                baseline[(r['tool'], r.get('input'), r['scale'])] = r
+    regressions = []
+    for r in results:
+        b = baseline.get((r['tool'], r.get('input'), r['scale']))
+        if b and b.get('entities_per_second') and r['entities_per_second'] < b['entities_per_second'] * (1 - tolerance):
+            regressions.append('{} {} at {}: {:.0f}/s vs {:.0f}/s'.format(
+                r['tool'], r.get('input') or '', r['scale'], r['entities_per_second'], b['entities_per_second']))
+    return regressions
+
+
+@click.command()
+@click.option('--scale', '-s', 'scales', type=int, multiple=True, default=DEFAULT_SCALES, show_default=True,
+              help='Approximate number of entities (repeatable)')
+@click.option('--jobs', '-j', type=int, default=1, show_default=True, help='Converter --jobs')
+@click.option('--batch-size', '-b', type=int, default=50000, show_default=True, help='Importer --batch-size')
+@click.option('--workers', '-w', type=int, default=4, show_default=True, help='Importer --workers')
+@click.option('--latency', type=float, default=0.0, show_default=True, help='Fake appliance latency in seconds')
+@click.option('--skip-import', is_flag=True, help='Only benchmark the converters')
+@click.option('--workdir', type=click.Path(file_okay=False), help='Keep generated files here (default: temporary)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Append results to FILE as JSON lines')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Compare with results in FILE')
+@click.option('--tolerance', type=float, default=0.2, show_default=True, help='Allowed throughput drop vs baseline')
+def main(scales, jobs, batch_size, workers, latency, skip_import, workdir, output, baseline, tolerance):
+    results = []
+    for scale in scales:
+        if workdir:
+            directory = os.path.join(workdir, str(scale))
+            results.extend(benchmark_scale(scale, directory, jobs, batch_size, workers, latency, skip_import))
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                results.extend(benchmark_scale(scale, directory, jobs, batch_size, workers, latency, skip_import))
+
+    click.echo('{:<26} {:<10} {:>10} {:>10} {:>12} {:>8} {:>10}'.format(
+        'tool', 'input', 'scale', 'seconds', 'entities/s', 'MB/s', 'peak MB'))
+    for r in results:
+        click.echo('{:<26} {:<10} {:>10} {:>10.2f} {:>12.0f} {:>8.2f} {:>10}'.format(
+            r['tool'], r.get('input', ''), r['scale'], r['seconds'], r['entities_per_second'], r['mb_per_second'],
+            r['peak_rss_mb'] if r['peak_rss_mb'] is not None else '-'))
+
+    if output:
+        with open(output, 'a') as f:
+            for r in results:
+                f.write(json.dumps(r) + '\n')
+
+    if baseline:
+        regressions = compare(results, baseline, tolerance)
+        for message in regressions:
+            click.echo('Regression: ' + message)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,15 @@ setup(
     include_package_data=True,
     install_requires=[
         'click',
-        'requests'
+        'requests',
+        'urllib3>=1.26'
     ],
     entry_points='''
         [console_scripts]
         vw_csv_nicknames_to_json=vwimporttools.vw_csv_nicknames_to_json:main
         vw_csv_relations_to_json=vwimporttools.vw_csv_relations_to_json:main
         vw_import_entities=vwimporttools.vw_import_entities:main
+        vw_export_data=vwimporttools.vw_export_data:main
+        vwimport=vwimporttools.vw_import:main
     '''
 )
@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from fake_appliance import FakeAppliance, make_certificate
+
+
+@pytest.fixture(scope='session')
+def certificate(tmp_path_factory):
+    return make_certificate(str(tmp_path_factory.mktemp('certificate')))
+
+
+@pytest.fixture
+def appliance(certificate):
+    certfile, keyfile = certificate
+    with FakeAppliance(busy=1, certfile=certfile, keyfile=keyfile) as vw:
+        yield vw
@@ -0,0 +1,24 @@
+import json
+from click.testing import CliRunner
+from vwimporttools import vw_import
+
+
+def test_unimported_entities_go_to_stdout(tmp_path):
+    aliases = tmp_path / 'aliases.csv'
+    aliases.write_text('10:00:00:00:00:00:00:01,port1\n')
+    relations = tmp_path / 'relations.csv'
+    relations.write_text('hba,hba1,,port1\nhost,h1,,hba1\n')
+    result = CliRunner().invoke(vw_import.main, ['convert-nicknames', '-t', 'hostport', str(aliases),
+                                                 'convert-relations', str(relations)])
+    assert result.exit_code == 0, result.output
+    document = json.loads(result.output)
+    assert [e.get('name', e.get('new_name')) for e in document['entities']] == ['port1', 'hba1', 'h1']
+
+
+def test_chain_results_are_passed_through(tmp_path):
+    relations = tmp_path / 'relations.csv'
+    relations.write_text('host,h1,,\n')
+    out = tmp_path / 'out.json'
+    results = vw_import.main.main(['convert-relations', '-o', str(out), str(relations)], standalone_mode=False)
+    assert results == [None]
+    assert json.loads(out.read_text())['entities'][0]['name'] == 'h1'
@@ -0,0 +1,49 @@
+import io
+import json
+import pytest
+from vwimporttools.vw_import_entities import VERSION_MISMATCH, start_import, validate_input
+from vwimporttools.vwtokenutils import VWtokenutils
+
+
+def test_upload_has_no_read_timeout(appliance):
+    appliance.latency = 0.5
+    vw = VWtokenutils(appliance.address, 'token', timeout=(5, 0.1))
+    rc, _ = vw.get('/api/v1/entities', {'type': 'host'})
+    assert not rc
+    body = json.dumps({'version': 2, 'entities': [{'name': 'h1', 'type': 'host'}]})
+    rc, transactionId, errors = start_import(vw, body)
+    assert rc and transactionId is not None and not errors
+
+
+def validate(document, **kwargs):
+    return validate_input(io.StringIO(json.dumps(document, **kwargs)))
+
+
+def test_validate_input_keeps_the_document():
+    document = {'version': 2, 'options': {'merge': True}, 'entities': [
+        {'name': 'h1', 'type': 'host'}, {'name': 'a1', 'new_name': 'n1', 'type': 'alias', 'wwn': '10:00:00:00:00:00:00:01'}]}
+    for kwargs in ({}, {'indent': 2}, {'separators': (',', ':')}):
+        rc, res = validate(document, **kwargs)
+        assert rc
+        assert json.loads(res.render()) == document
+        assert res.types == ['host', 'alias']
+        assert '\n' not in res.render().decode('utf-8')
+
+
+@pytest.mark.parametrize('document, message', [
+    ({'version': 1, 'entities': [{'name': 'h1', 'type': 'host'}]}, VERSION_MISMATCH),
+    ({'entities': [{'name': 'h1', 'type': 'host'}]}, VERSION_MISMATCH),
+    ({'version': 2, 'entities': []}, 'Provided JSON contains no entities'),
+    ({'version': 2, 'entities': [{'name': 'h1', 'type': 'host'}, {'name': 'h2'}]},
+     'Entity 1 (h2) is invalid: missing type'),
+    ({'version': 2, 'entities': [{'name': 'h1', 'type': 'host', 'wwn': 'xyz'}]},
+     "Entity 0 (h1) is invalid: malformed WWN 'xyz'"),
+])
+def test_validate_input_errors(document, message):
+    assert validate(document) == (False, message)
+
+
+def test_validate_input_rejects_trailing_data():
+    rc, message = validate_input(io.StringIO('{"version":2,"entities":[{"name":"h1","type":"host"}]} trailing'))
+    assert not rc
+    assert message.startswith('Provided JSON could not be parsed after entity 1: Extra data')
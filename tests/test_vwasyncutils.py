@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+from vwimporttools.vwasyncutils import AsyncVWtokenutils
+from vwimporttools.vwtokenutils import Poller
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_verbs_run_concurrently(appliance):
+    appliance.latency = 0.2
+    body = json.dumps({'version': 2, 'entities': [{'name': 'h1', 'type': 'host'}]})
+
+    async def verbs():
+        async with AsyncVWtokenutils(appliance.address, 'token', concurrency=8) as vw:
+            started = [await vw.post('/api/v1/entitiesimport/start', body) for _ in range(2)]
+            assert all(rc and res['status'] == 'OK' for rc, res in started)
+            kept, discarded = (res['result']['transactionId'] for _, res in started)
+            begin = time.monotonic()
+            results = await asyncio.gather(
+                vw.get('/api/v1/entities', {'type': 'host'}),
+                vw.put('/api/v1/entitiesimport/commit', json.dumps({'async': True, 'transactionId': kept})),
+                vw.get('/api/v1/entitiesimport/status', {'transactionId': kept}),
+                vw.delete('/api/v1/entitiesimport/discard', json.dumps({'async': True, 'transactionId': discarded})))
+            return results, time.monotonic() - begin
+
+    results, elapsed = run(verbs())
+    assert all(rc for rc, _ in results)
+    assert results[1][1]['status'] == 'OK'
+    # four requests of 0.2 s each, in flight at the same time
+    assert elapsed < 0.6
+    assert appliance.stats['DELETE'] == 1
+
+
+def test_gather_data_keeps_payload_order(appliance):
+    payloads = [{'chartType': 'topxcard', 'metricName': 'm{}'.format(i), 'entityType': 'host', 'limit': i + 1}
+                for i in range(6)]
+
+    async def gather():
+        async with AsyncVWtokenutils(appliance.address, 'token', concurrency=3) as vw:
+            return await vw.gather_data(payloads)
+
+    results = run(gather())
+    assert [rc for rc, _ in results] == [True] * 6
+    assert appliance.stats['PUT'] == 6
+
+
+def test_errors_are_returned(appliance):
+    async def failing():
+        async with AsyncVWtokenutils(appliance.address, 'token') as vw:
+            return await asyncio.gather(vw.get('/api/v1/nothing'), vw.put('/api/v1/entitiesimport/commit', '{}'))
+
+    (rc_get, res_get), (rc_put, res_put) = run(failing())
+    assert not rc_get and '404' in res_get
+    assert not rc_put and '400' in res_put
+
+
+def test_connection_errors_are_returned():
+    async def unreachable():
+        async with AsyncVWtokenutils('127.0.0.1:9', 'token') as vw:
+            return await vw.get('/api/v1/entities', timeout=(0.5, 0.5))
+
+    rc, res = run(unreachable())
+    assert not rc and 'exception was caught' in res
+
+
+def test_per_call_timeout(appliance):
+    appliance.latency = 1.0
+
+    async def slow():
+        async with AsyncVWtokenutils(appliance.address, 'token') as vw:
+            return await vw.get('/api/v1/entities', {'type': 'host'}, timeout=(1, 0.1))
+
+    rc, res = run(slow())
+    assert not rc and 'timed out' in res
+
+
+def test_poll_deadline(appliance):
+    appliance.busy = 1000000
+    poller = Poller(initial=0.01, cap=0.05, deadline=0.3)
+
+    async def report():
+        async with AsyncVWtokenutils(appliance.address, 'token', poller=poller) as vw:
+            return await vw.get_data({'chartType': 'topxcard', 'metricName': 'm', 'entityType': 'host'})
+
+    begin = time.monotonic()
+    rc, res = run(report())
+    assert not rc and 'did not finish within 0.3 seconds' in res
+    assert time.monotonic() - begin < 2
+    assert poller.stats()['polls'] > 1
@@ -0,0 +1,79 @@
+import os
+import pickle
+import sqlite3
+from vwimporttools.vwcacheutils import BlockCache, EntityCache
+
+KEY = 'ab' * 32
+
+
+def test_entity_cache_file_is_shared_as_json(tmp_path):
+    path = str(tmp_path / 'entities.db')
+    key = ('vw1', 'host', None, None)
+    value = [{'name': 'h1', 'tags': ['a']}]
+    EntityCache(path=path).put(key, value)
+    assert EntityCache(path=path).get(key) == value
+    row = sqlite3.connect(path).execute('SELECT value FROM entities').fetchone()
+    assert row[0] == '[{"name": "h1", "tags": ["a"]}]'
+
+
+def test_entity_cache_drops_rows_that_are_not_json(tmp_path):
+    path = str(tmp_path / 'entities.db')
+    key = ('vw1', 'host', None, None)
+    cache = EntityCache(path=path)
+    cache.put(key, [])
+    cache.db.execute('UPDATE entities SET value = ?', (pickle.dumps([{'name': 'h1'}]),))
+    cache.db.commit()
+    other = EntityCache(path=path)
+    assert other.get(key) is None
+    assert other.stats() == {'hits': 0, 'misses': 1, 'size': 0}
+    assert other.db.execute('SELECT COUNT(*) FROM entities').fetchone()[0] == 0
+
+
+def test_entity_cache_ttl(tmp_path):
+    cache = EntityCache(ttl=0)
+    cache.put(('vw1', 'host', None, None), [])
+    assert cache.get(('vw1', 'host', None, None)) is None
+
+
+def test_entity_cache_reads_respect_maxsize(tmp_path):
+    path = str(tmp_path / 'entities.db')
+    keys = [('vw1', 'host', 'name', str(i)) for i in range(10)]
+    writer = EntityCache(maxsize=10, path=path)
+    for key in keys:
+        writer.put(key, [])
+    reader = EntityCache(maxsize=3, path=path)
+    for key in keys:
+        assert reader.get(key) == []
+    assert reader.stats()['size'] == 3
+    assert list(reader.entries) == keys[-3:]
+
+
+def test_block_cache_keeps_text_verbatim(tmp_path):
+    cache = BlockCache(str(tmp_path))
+    cache.put(KEY, {'lengths': [3]}, '{"a"\n')
+    assert BlockCache(str(tmp_path)).get(KEY) == ({'lengths': [3]}, '{"a"\n')
+
+
+def test_block_cache_unreadable_entries_are_misses(tmp_path):
+    cache = BlockCache(str(tmp_path))
+    cache.put(KEY, [])
+    with open(cache._file(KEY), 'wb') as f:
+        f.write(pickle.dumps([1]))
+    assert cache.get(KEY) is None
+    cache.put(KEY, [])
+
+    def decode(value, text):
+        raise KeyError('lengths')
+
+    assert cache.get(KEY, decode) is None
+    assert cache.stats() == {'hits': 0, 'misses': 2}
+
+
+def test_block_cache_evicts_only_entries(tmp_path):
+    cache = BlockCache(str(tmp_path), max_bytes=0)
+    cache.put(KEY, [], 'x' * 100)
+    temporary = os.path.join(str(tmp_path), 'ab', 'in-progress.tmp')
+    with open(temporary, 'w') as f:
+        f.write('partial')
+    assert cache.evict() == 1
+    assert os.listdir(os.path.dirname(temporary)) == ['in-progress.tmp']
@@ -0,0 +1,45 @@
+from click.testing import CliRunner
+from vwimporttools import vw_csv_nicknames_to_json
+from vwimporttools.vwcsvutils import multiline_fields
+
+
+def test_multiline_fields(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text('1,john"s_hba\n2,"a, b"\n')
+    assert not multiline_fields(str(path))
+    path.write_text('1,"two\nlines"\n')
+    assert multiline_fields(str(path))
+
+
+def test_jobs_fall_back_to_one_process_for_multiline_fields(tmp_path):
+    path = tmp_path / 'aliases.csv'
+    path.write_text('1,"two\nlines"\n' + ''.join('{},alias{}\n'.format(i, i) for i in range(2, 20000)))
+    outputs = []
+    for options in ([], ['-j', '4', '--cache', str(tmp_path / 'cache')]):
+        out = str(tmp_path / 'out{}.json'.format(len(outputs)))
+        result = CliRunner().invoke(vw_csv_nicknames_to_json.main, ['-t', 'hostport'] + options + [str(path), out])
+        assert result.exit_code == 0, result.output
+        outputs.append(open(out).read())
+    assert outputs[0] == outputs[1]
+    assert '"new_name":"two\\nlines"' in outputs[0]
+
+
+def test_cache_reuses_unchanged_blocks(tmp_path):
+    path = tmp_path / 'aliases.csv'
+    rows = ['{:016x},alias{}\n'.format(i, i) for i in range(20000)]
+    cache = ['--cache', str(tmp_path / 'cache'), '--cache-block-size', '16']
+    outputs = []
+    for options in ([], cache, cache):
+        if len(outputs) == 2:
+            rows[10000] = '{:016x},renamed\n'.format(10000)
+        path.write_text(''.join(rows))
+        out = str(tmp_path / 'out{}.json'.format(len(outputs)))
+        result = CliRunner().invoke(vw_csv_nicknames_to_json.main, ['-t', 'hostport'] + options + [str(path), out])
+        assert result.exit_code == 0, result.output
+        outputs.append((open(out).read(), result.output))
+    assert outputs[1][0] == outputs[0][0]
+    assert 'Reused 0 of ' in outputs[1][1]
+    blocks = int(outputs[1][1].split(' of ')[1].split()[0])
+    assert blocks > 4
+    assert 'Reused {} of {} '.format(blocks - 1, blocks) in outputs[2][1]
+    assert '"new_name":"renamed"' in outputs[2][0]
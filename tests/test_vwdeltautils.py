@@ -0,0 +1,62 @@
+from click.testing import CliRunner
+from bench_fabric import Fabric
+from vwimporttools import vw_csv_relations_to_json, vw_import_entities
+from vwimporttools.vwdeltautils import diff_entity
+
+
+def import_json(appliance, path, *options):
+    return CliRunner().invoke(vw_import_entities.main, ['-h', appliance.address, '-t', 'token'] + list(options) + [path])
+
+
+def test_unchanged_rerun_sends_no_entities(appliance, tmp_path):
+    relations = str(tmp_path / 'relations.csv')
+    Fabric(hosts=30).write_relations(relations)
+    converted = str(tmp_path / 'relations.json')
+    assert CliRunner().invoke(vw_csv_relations_to_json.main, [relations, converted]).exit_code == 0
+
+    first = import_json(appliance, converted, '--delta')
+    assert first.exit_code == 0, first.output
+    received = appliance.stats['entities_received']
+    assert '{0} of {0} entities changed'.format(received) in first.output
+
+    again = import_json(appliance, converted, '--delta')
+    assert again.exit_code == 0, again.output
+    assert '0 of {} entities changed'.format(received) in again.output
+    assert appliance.stats['entities_received'] == received
+
+
+def test_changed_members_are_sent(appliance, tmp_path):
+    relations = tmp_path / 'relations.csv'
+    relations.write_text('hba,hba1,,p1,p2\napplication,app1,,hba1,i1:t1,i1:t2:3\n')
+    converted = str(tmp_path / 'relations.json')
+    CliRunner().invoke(vw_csv_relations_to_json.main, [str(relations), converted])
+    assert import_json(appliance, converted).exit_code == 0
+
+    relations.write_text('hba,hba1,,p1,p3\napplication,app1,,hba1,i1:t1,i1:t2:4\n')
+    CliRunner().invoke(vw_csv_relations_to_json.main, [str(relations), converted])
+    result = import_json(appliance, converted, '--delta', '--prune')
+    assert '2 of 2 entities changed' in result.output
+    assert appliance.entities['hba']['hba1']['child_entities'] == ['p1', 'p3']
+    assert appliance.entities['application']['app1']['itl_patterns'] == [
+        {'initiator': 'i1', 'target': 't1'}, {'initiator': 'i1', 'target': 't2', 'lun': '4'}]
+
+
+def test_itl_patterns_compare_by_pattern():
+    entity = {'name': 'app1', 'type': 'application', 'tags': [],
+              'itl_patterns': [{'edit_type': 'add', 'initiator': 'i1', 'target': 't1'},
+                               {'edit_type': 'add', 'initiator': 'i1', 'target': 't2', 'lun': '3'}]}
+    for current in ([{'initiator': 'i1', 'target': 't2', 'lun': 3}, {'initiator': 'i1', 'target': 't1'}],
+                    ['i1:t1', 'i1:t2:3'], 'i1:t1;i1:t2:3', [['i1', 't1'], ['i1', 't2', '3']]):
+        assert diff_entity(entity, {'name': 'app1', 'tags': [], 'itl_patterns': current}) is None
+    assert diff_entity(entity, {'name': 'app1', 'tags': [], 'itl_patterns': ['i1:t1']}) == {
+        'name': 'app1', 'type': 'application',
+        'itl_patterns': [{'edit_type': 'add', 'initiator': 'i1', 'target': 't2', 'lun': '3'}]}
+
+
+def test_missing_properties_are_unknown():
+    entity = {'name': 'host1', 'type': 'host', 'tags': ['a'], 'child_entities': {'add': ['hba1']}}
+    unknown = set()
+    assert diff_entity(entity, {'name': 'host1'}, unknown=unknown) is None
+    assert unknown == {'tags', 'child_entities'}
+    assert diff_entity(entity, {'name': 'host1', 'tags': ['a'], 'children': [{'name': 'hba2'}]}) == {
+        'name': 'host1', 'type': 'host', 'child_entities': {'add': ['hba1']}}
@@ -0,0 +1,90 @@
+import json
+from click.testing import CliRunner
+from vwimporttools import vw_csv_relations_to_json, vw_import_entities
+from vwimporttools.vw_import_entities import document_index, split_batches
+from vwimporttools.vwgraphutils import DependencyIndex, describe
+from vwimporttools.vwjsonutils import EntityDocument
+
+
+def entity(etype, name, *members):
+    field = 'devices' if etype == 'application' else 'child_entities'
+    return {'name': name, 'type': etype, 'tags': [], field: {'add': list(members)}}
+
+
+CYCLIC = [entity('application', 'a1', 'a2'), entity('application', 'a2', 'a3'), entity('application', 'a3', 'a1'),
+          entity('host', 'h1', 'hba1')]
+
+# deliberately listed against dependency order
+MIXED = [entity('application', 'a1', 'h1', 'a2'), entity('application', 'a2', 'h2'), entity('host', 'h1', 'hba1'),
+         entity('host', 'h2', 'hba2', 'hba3'), entity('hba', 'hba1', 'p1'), entity('hba', 'hba2', 'p2'),
+         entity('hba', 'hba3'), entity('storagearray', 's1', 'c1'), entity('storagecontroller', 'c1', 'm1'),
+         entity('iomodule', 'm1', 'sp1'), entity('host', 'h3')]
+
+
+def index_of(entities):
+    index = DependencyIndex()
+    for e in entities:
+        index.add(e['name'], *describe(e))
+    return index
+
+
+def test_resolve_reports_cycle_path():
+    index = index_of(CYCLIC)
+    unknown, cycles = index.resolve()
+    assert cycles == [['a1', 'a2', 'a3', 'a1']]
+    assert unknown == [('h1', 'hba1')]
+
+
+def test_levels_across_types():
+    index = index_of(MIXED)
+    assert index.resolve() == ([], [])
+    assert index.levels() == [['hba1', 'hba2', 'hba3', 'm1'], ['h1', 'h2', 'c1', 'h3'], ['a2', 's1'], ['a1']]
+    ordered = index.ordered()
+    position = {name: i for i, name in enumerate(ordered)}
+    for e in MIXED:
+        for member in describe(e)[2]:
+            if member in position:
+                assert position[member] < position[e['name']]
+
+
+def test_unknown_references_skip_port_parents():
+    unknown, _ = index_of([entity('host', 'h1', 'hba9'), entity('hba', 'hba1', 'p1')]).resolve()
+    assert unknown == [('h1', 'hba9')]
+
+
+def test_no_batch_references_a_later_batch():
+    document = EntityDocument()
+    for e in MIXED:
+        document.append(e)
+    tiers = split_batches(document, 2)
+    tier_of = {}
+    for number, tier in enumerate(tiers):
+        for chunk in tier:
+            assert 0 < len(chunk) <= 2
+            for e in chunk.entities():
+                tier_of[e['name']] = number
+    assert sorted(tier_of) == sorted(e['name'] for e in MIXED)
+    for e in MIXED:
+        for member in describe(e)[2]:
+            if member in tier_of:
+                assert tier_of[member] < tier_of[e['name']]
+    assert document_index(document).resolve() == ([], [])
+
+
+def test_converter_exits_on_cycle(tmp_path):
+    path = tmp_path / 'relations.csv'
+    path.write_text('application,a1,,a2\napplication,a2,,a1\nhost,h1,,hba1\nhba,hba1,,p1\n')
+    result = CliRunner().invoke(vw_csv_relations_to_json.main, [str(path), '-'])
+    assert result.exit_code == 1
+    assert 'a1 -> a2 -> a1' in result.output
+    assert '"entities"' not in result.output
+
+
+def test_import_exits_on_cycle(tmp_path, appliance):
+    path = tmp_path / 'import.json'
+    path.write_text(json.dumps({'version': 2, 'entities': CYCLIC}))
+    result = CliRunner().invoke(vw_import_entities.main, ['-h', appliance.address, '-t', 'token', '-b', '2',
+                                                           str(path)])
+    assert result.exit_code == 1
+    assert 'a1 -> a2 -> a3 -> a1' in result.output
+    assert 'POST' not in appliance.stats
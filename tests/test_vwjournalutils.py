@@ -0,0 +1,90 @@
+import json
+from click.testing import CliRunner
+from vwimporttools import vw_import_entities
+from vwimporttools.vw_import_entities import import_batches, split_batches, start_import
+from vwimporttools.vwjournalutils import ImportJournal
+from vwimporttools.vwjsonutils import EntityDocument
+from vwimporttools.vwtokenutils import Poller, VWtokenutils
+
+ENTITIES = [{'name': 'hba1', 'type': 'hba', 'child_entities': {'add': ['p1']}},
+            {'name': 'h1', 'type': 'host', 'child_entities': {'add': ['hba1']}},
+            {'name': 'a1', 'type': 'application', 'devices': {'add': ['h1']}}]
+
+
+def document(entities=ENTITIES):
+    d = EntityDocument()
+    for e in entities:
+        d.append(e)
+    return d
+
+
+def client(appliance):
+    return VWtokenutils(appliance.address, 'token', Poller(initial=0.001, deadline=5))
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'journal')
+    with ImportJournal(path) as journal:
+        journal.record('b1', 'start', 7, host='vw1', count=5)
+        journal.record('b1', 'commit', 7, host='vw1', count=5)
+    with open(path, 'ab') as f:
+        f.write(b'{"time":"2021-01-01T00:00:00","host":"vw1","batch":"b1","sta')
+    with ImportJournal(path) as journal:
+        assert journal.last('b1', 'vw1')['stage'] == 'commit'
+        journal.record('b2', 'done', 8, host='vw1', count=1)
+    with ImportJournal(path) as journal:
+        assert journal.last('b1', 'vw1')['stage'] == 'commit'
+        assert journal.last('b2', 'vw1')['transactionId'] == 8
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[-1])['batch'] == 'b2'
+
+
+def test_resume_after_partial_completion(tmp_path, appliance):
+    vw = client(appliance)
+    tiers = split_batches(document(), 1)
+    (done,), (started,), (fresh,) = tiers
+    path = str(tmp_path / 'journal')
+    with ImportJournal(path) as journal:
+        journal.record(done.digest(), 'done', 1, host=vw.host, count=1)
+        # uploaded, but the run stopped before the commit
+        rc, transactionId, _ = start_import(vw, started.body())
+        assert rc
+        journal.record(started.digest(), 'start', transactionId, host=vw.host, count=1)
+    uploads = appliance.stats['POST']
+
+    with ImportJournal(path) as journal:
+        results = import_batches(vw, tiers, 2, False, journal=journal, resume=True)
+    assert [r['ok'] for r in results] == [True, True, True]
+    assert [r['resumed'] for r in results] == ['skipped', 'polled', None]
+    assert results[1]['transactionId'] == transactionId
+    assert appliance.stats['POST'] == uploads + 1
+    # the chunk recorded as done is not uploaded again
+    assert sorted(appliance.entities) == ['application', 'host']
+    with ImportJournal(path) as journal:
+        assert [journal.last(chunk.digest(), vw.host)['stage'] for chunk in (done, started, fresh)] == ['done'] * 3
+
+
+def test_resume_restarts_a_lost_transaction(tmp_path, appliance):
+    vw = client(appliance)
+    tiers = [[document(ENTITIES[:1])]]
+    path = str(tmp_path / 'journal')
+    with ImportJournal(path) as journal:
+        journal.record(tiers[0][0].digest(), 'commit', 999, host=vw.host, count=1)
+        results = import_batches(vw, tiers, 1, False, journal=journal, resume=True)
+    assert results[0]['ok'] and results[0]['resumed'] == 'restarted'
+    assert results[0]['transactionId'] != 999
+    assert appliance.stats['POST'] == 1
+
+
+def test_rerun_with_resume_uploads_nothing(tmp_path, appliance):
+    path = tmp_path / 'import.json'
+    path.write_text(json.dumps({'version': 2, 'entities': ENTITIES}))
+    journal = str(tmp_path / 'journal')
+    args = ['-h', appliance.address, '-t', 'token', '-b', '1', '--journal', journal, str(path)]
+    result = CliRunner().invoke(vw_import_entities.main, args)
+    assert result.exit_code == 0, result.output
+    assert appliance.stats['POST'] == 3
+    result = CliRunner().invoke(vw_import_entities.main, args + ['--resume'])
+    assert result.exit_code == 0, result.output
+    assert appliance.stats['POST'] == 3
@@ -0,0 +1,79 @@
+import io
+import json
+import pytest
+from vwimporttools.vwjsonutils import EntityDocument, read_document
+
+DOCUMENT = {'version': 2, 'entities': [
+    {'name': 'h1', 'type': 'host', 'tags': ['a, b', 'quote " and \\ slash'], 'weight': 12345.678e-3},
+    {'name': 'café ☃', 'type': 'application', 'itl_patterns': [{'i': '*', 't': 'x', 'l': 0}]},
+    123456789, [], {},
+]}
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, text):
+        io.StringIO.__init__(self, text)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return io.StringIO.read(self, size)
+
+
+def parse(text, chunk_size=1 << 16):
+    members = {}
+    for key, value in read_document(io.StringIO(text), chunk_size):
+        if key == 'entities':
+            members.setdefault(key, []).append(value)
+        else:
+            members[key] = value
+    return members
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_read_document_across_chunk_boundaries(indent):
+    text = json.dumps(DOCUMENT, indent=indent)
+    for chunk_size in range(1, 40):
+        assert parse(text, chunk_size) == DOCUMENT
+
+
+def test_read_document_text_is_the_source():
+    text = '{"version": 2, "entities": [ {"name": "h1", "type": "host"} ,\n{"name":"h2","type":"host"}]}'
+    for chunk_size in (1, 7, 1 << 16):
+        items = list(read_document(io.StringIO(text), chunk_size, with_text=True))
+        assert [t for _, _, t in items] == ['2', '{"name": "h1", "type": "host"}', '{"name":"h2","type":"host"}']
+
+
+def test_read_document_large_entity_in_linear_reads():
+    entity = {'name': 'app', 'type': 'application', 'members': ['member-{}'.format(i) for i in range(100000)]}
+    text = json.dumps({'version': 2, 'entities': [entity]})
+    fp = CountingReader(text)
+    assert [v for k, v in read_document(fp, chunk_size=1024) if k == 'entities'] == [entity]
+    # the read size grows geometrically, not one chunk per retry
+    assert fp.reads < 20
+
+
+@pytest.mark.parametrize('text', ['{"version":2,"entities":[1]} trailing', '{"version":2,"entities":[1]}{}',
+                                  '{} x', '{"version":2,"entities":[1]'])
+def test_read_document_rejects_extra_or_missing_data(text):
+    with pytest.raises(ValueError):
+        list(read_document(io.StringIO(text), chunk_size=4))
+
+
+def test_read_document_allows_trailing_whitespace():
+    assert parse('{"version":2,"entities":[1]}\n \n', 4) == {'version': 2, 'entities': [1]}
+    assert parse(' {} ') == {}
+
+
+def test_read_document_yields_unknown_members():
+    assert parse('{"version":2,"options":{"merge":true},"entities":[1],"note":"x"}', 3) == {
+        'version': 2, 'options': {'merge': True}, 'entities': [1], 'note': 'x'}
+
+
+@pytest.mark.parametrize('pretty', [False, True])
+def test_document_body_keeps_extra_members(pretty):
+    document = EntityDocument(2, {'options': {'merge': True}})
+    document.append({'name': 'h1', 'type': 'host'})
+    assert json.loads(document.render(pretty)) == {'version': 2, 'options': {'merge': True},
+                                                   'entities': [{'name': 'h1', 'type': 'host'}]}
+    assert document.subset([0]).extra == document.extra
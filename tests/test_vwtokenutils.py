@@ -0,0 +1,38 @@
+import json
+import threading
+from vwimporttools.vwtokenutils import Poller, VWtokenutils
+
+
+def test_poller_stats_shared_by_threads():
+    poller = Poller(initial=0.001, cap=0.001, jitter=0)
+
+    def poll():
+        calls = iter(range(50))
+        poller.run(lambda: (next(calls) == 49, None))
+
+    threads = [threading.Thread(target=poll) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = poller.stats()
+    assert stats['polls'] == 8 * 50
+    assert abs(stats['slept'] - 8 * 49 * 0.001) < 1e-9
+
+
+def test_only_idempotent_verbs_are_retried(appliance):
+    appliance.latency = 0.3
+    vw = VWtokenutils(appliance.address, 'token', timeout=(5, 0.1))
+    rc, _ = vw.get('/api/v1/entities', {'type': 'host'})
+    assert not rc and appliance.stats['GET'] == 4
+    rc, _ = vw.put('/api/v1/entitiesimport/commit', json.dumps({'async': True, 'transactionId': 1}))
+    assert not rc and appliance.stats['PUT'] == 1
+
+
+def test_trend_columns_accept_float_timestamps():
+    results = [{'entityName': 'h1', 'data': [[1000, 1.5], [2000.0, None]]},
+               {'entityName': 'h2', 'data': [[1000.0, 2]]}]
+    columns = VWtokenutils.process_topxtrend_columns({}, results, 'm', 'host')['m']
+    assert list(columns.timestamp) == [1000, 2000, 1000]
+    assert list(columns.entity) == [0, 0, 1]
+    assert list(columns.value)[0::2] == [1.5, 2.0]
@@ -8,37 +8,82 @@ __version__ = '1.1'
 """
 
 import click
-import json
 import os
+from vwimporttools.vwcacheutils import BlockCache
+from vwimporttools.vwcsvutils import convert_parallel, mapped_lines, multiline_fields, regular_file_path, read_nicknames
+from vwimporttools.vwentities import alias_entity
+from vwimporttools.vwjsonutils import EntityWriter
+from vwimporttools.vwprofileutils import NULL_PROFILE, PROFILE_FORMATS, cli_profile
 
 
-class Entity:
-    def __init__(self, name, wwn, etype):
-        self.new_name = name
-        self.wwn = wwn
-        self.type = etype
+def nickname_entities(csv_in, etype):
+    for wwn, nickname in read_nicknames(csv_in):
+        yield alias_entity(nickname, wwn, etype)
 
-    def __lt__(self, other):
-        return self.name < other.name
 
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=False, indent=2)
-
-
-class Top:
-    def __init__(self):
-        self.version = 2
-        self.entities = []
+def nickname_options(f):
+    """
+    Adds the options shared by vw_csv_nicknames_to_json and
+    vwimport convert-nicknames.
+    """
+    for option in reversed((
+        click.option('--etype', '-t', prompt='Entity type (either hostport or storageport)'),
+        click.option('--pretty', '-p', is_flag=True, help='Indent the JSON output for readability'),
+        click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+                     help='Number of processes converting a regular input file'),
+        click.option('--cache', 'cache_dir', envvar='VI_CONVERT_CACHE', type=click.Path(file_okay=False),
+                     help='Reuse converted blocks of a regular input file from DIR'),
+        click.option('--cache-size', type=click.IntRange(min=1), default=1024, show_default=True,
+                     help='Maximum size of the --cache directory in MB'),
+        click.option('--cache-block-size', type=click.IntRange(min=1), default=1024, show_default=True,
+                     help='Size in KB after which a --cache block ends at the next anchor row'),
+        click.option('--profile', 'profile_format', type=click.Choice(PROFILE_FORMATS),
+                     help='Report stage timings on stderr'),
+        click.option('--cprofile', type=click.Path(dir_okay=False), help='Write cProfile statistics to FILE'),
+    )):
+        f = option(f)
+    return f
+
+
+def convert_nicknames(csv_in, writer, etype, jobs=1, cache_dir=None, cache_size=1024, cache_block_size=1024,
+                      profile=NULL_PROFILE):
+    """
+    Converts the WWN,nickname rows of csv_in to etype aliases and writes
+    them to writer, an EntityWriter (or a DocumentWriter) that has not been
+    opened yet.
+    """
+    if os.name == 'nt':
+        success = 'success'
+    else:
+        success = b'\xe2\x9c\x94'.decode('utf-8')
 
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=False, indent=2)
+    path = regular_file_path(csv_in)
+    if (jobs > 1 or cache_dir) and path and multiline_fields(path, csv_in.encoding):
+        click.echo(click.style('Quoted fields span lines; converting in a single process without the cache',
+                               fg='yellow'), err=True)
+        jobs, cache_dir = 1, None
+    cache = BlockCache(cache_dir, cache_size << 20, cache_block_size << 10) if cache_dir else None
+    with writer:
+        if (jobs > 1 or cache is not None) and path:
+            with profile.stage('convert'):
+                convert_parallel(path, csv_in.encoding, jobs, nickname_entities, (etype,), writer, cache=cache)
+        else:
+            write = profile.wrap('write', writer.write)
+            entities = nickname_entities(mapped_lines(path, csv_in.encoding) if path else csv_in, etype)
+            for entity in profile.iterate('parse', entities):
+                write(entity)
+
+    if cache is not None:
+        cache.close()
+        click.echo(click.style('{} Reused {} of {} block(s) from the cache'.format(
+            success, cache.hits, cache.hits + cache.misses), fg='green'), err=True)
 
 
 @click.command('vw_csv_nicknames_to_json', short_help='Convert CSV nicknames to importable JSON')
-@click.option('--etype', '-t', prompt='Entity type (either hostport or storageport)')
+@nickname_options
 @click.argument('csv_in', type=click.File('r'))
 @click.argument('json_out', type=click.File('w'))
-def main(etype, csv_in, json_out):
+def main(etype, pretty, jobs, cache_dir, cache_size, cache_block_size, profile_format, cprofile, csv_in, json_out):
     """
     This script generates an importable JSON file from a CSV file containing
     WWN to nickname (alias) mappings.
@@ -50,36 +95,43 @@ def main(etype, csv_in, json_out):
     WWN2,nickname2
 
     Output is a JSON file that can be imported into VirtualWisdom, either via
-    the UI or via the command line using the vw_import_entities script.
+    the UI or via the command line using the vw_import_entities script. The
+    JSON is written in compact form; use --pretty (-p) for indented output.
 
     The --etype (-t) argument must be either hostport or storageport.
 
     The command is pipeable; simply replace either the input file, output file,
     or both with a dash (-).
 
+    Large input files can be converted on several CPU cores with --jobs (-j);
+    the output is the same as with a single process. Input read from a pipe,
+    and files with quoted fields that span lines, are always converted by a
+    single process (and without --cache). Regular input files are read
+    through a memory mapping.
+
+    With --cache DIR, the converted entities of every block of a regular
+    input file are kept in DIR, keyed on the block's content, and blocks
+    that have not changed since an earlier run are not parsed again. Block
+    boundaries follow the content: a block ends at the first anchor row (on
+    average one row in 512) after --cache-block-size KB, so rows added,
+    removed or edited in one place only invalidate the blocks around them.
+    Smaller blocks make the cache more selective at the cost of more files.
+    The least recently used blocks are removed once DIR exceeds --cache-size
+    MB.
+
+    --profile table (or json, for JSON lines) reports the time spent
+    parsing, building and writing entities on stderr; --cprofile FILE saves
+    cProfile statistics for the run.
+
     Examples (Linux/macOS/Unix):
 
     (venv) $ vw_csv_nicknames_to_json -t hostport aliases.csv import.json
 
     (venv) $ cat aliases.csv | vw_csv_nicknames_to_json -t hostport - - | vw_import_entities ...
     """
-    if os.name == 'nt':
-        success = 'success'
-        fail = 'fail '
-    else:
-        success = b'\xe2\x9c\x94'.decode('utf-8')
-        fail = b'\xe2\x9c\x98'.decode('utf-8') + ' '
-
-
-    top = Top()
-
-    for line in csv_in:
-        if not ',' in line:
-            continue
-        top.entities.append(Entity(line.split(',')[1].strip().replace("'", '').replace('"', ''),
-            line.split(',')[0].strip(), etype))
-
-    json_out.write(top.to_JSON())
+    profile = cli_profile(profile_format, cprofile)
+    convert_nicknames(csv_in, EntityWriter(json_out, indent=2 if pretty else None), etype, jobs, cache_dir, cache_size,
+                      cache_block_size, profile)
     json_out.write('\n')
 
 
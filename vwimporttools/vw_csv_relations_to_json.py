@@ -8,66 +8,129 @@ __version__ = '1.0.1'
 """
 
 import click
-import json
+import gc
 import os
+from vwimporttools.vwcsvutils import convert_parallel, mapped_lines, multiline_fields, regular_file_path, read_relations
+from vwimporttools.vwentities import ApplicationEntity, ApplicationIndex, relation_entity
+from vwimporttools.vwgraphutils import DependencyIndex
+from vwimporttools.vwjsonutils import EntityWriter
+from vwimporttools.vwprofileutils import NULL_PROFILE, PROFILE_FORMATS, cli_profile
 
 
-class Entity:
-    def __init__(self, name, etype, tags, child_entities):
-        self.name = name
-        self.type = etype
-        self.tags = tags
-        self.child_entities = {"add": child_entities}
-
-    def __lt__(self, other):
-        return self.name < other.name
-
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=False, indent=2)
+def relation_entities(csv_in, applications=None):
+    """
+    Yields the entity for every row of csv_in. If applications (an
+    ApplicationIndex) is given, applications are added to it instead of
+    being yielded, so that rows defining the same application are merged.
+    """
+    for etype, name, tags, members in read_relations(csv_in):
+        entity = relation_entity(etype, name, tags, members)
+        if applications is not None and isinstance(entity, ApplicationEntity):
+            applications.add(entity)
+        else:
+            yield entity
 
 
-class ApplicationEntity:
-    def __init__(self, name, etype, tags, initiator_list):
-        self.name = name
-        self.type = etype
-        self.tags = tags
-        self.itl_patterns = []
-        self.devices = {'add' : []}
+def relation_options(f):
+    """
+    Adds the options shared by vw_csv_relations_to_json and
+    vwimport convert-relations.
+    """
+    for option in reversed((
+        click.option('--pretty', '-p', is_flag=True, help='Indent the JSON output for readability'),
+        click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+                     help='Number of processes converting a regular input file'),
+        click.option('--strict', is_flag=True, help='Fail if a member refers to an entity not defined in the input'),
+        click.option('--profile', 'profile_format', type=click.Choice(PROFILE_FORMATS),
+                     help='Report stage timings on stderr'),
+        click.option('--cprofile', type=click.Path(dir_okay=False), help='Write cProfile statistics to FILE'),
+    )):
+        f = option(f)
+    return f
+
+
+def convert_relations(csv_in, writer, jobs=1, strict=False, profile=NULL_PROFILE):
+    """
+    Converts the entity definitions in csv_in and writes the entities in
+    dependency order to writer, an EntityWriter (or a DocumentWriter) that
+    has not been opened yet. Problems are reported on stderr; returns
+    False, with nothing written, if there are reference cycles (or, with
+    strict, unknown references).
+    """
+    # every entity is held until the output is written; none of them form
+    # reference cycles, so keep the cyclic collector from rescanning them
+    # until then, and leave it as the caller had it
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _convert_relations(csv_in, writer, jobs, strict, profile)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _convert_relations(csv_in, writer, jobs, strict, profile):
+    if os.name == 'nt':
+        success = 'success'
+        fail = 'fail '
+    else:
+        success = b'\xe2\x9c\x94'.decode('utf-8')
+        fail = b'\xe2\x9c\x98'.decode('utf-8') + ' '
 
-        for i in initiator_list:
-            if i.count(":") == 2:
-                # I:T:L
-                self.itl_patterns.append({"edit_type": "add", "initiator": i.split(":")[0], "target": i.split(":")[1], "lun": i.split(":")[2]})
-            elif i.count(":") == 1:
-                # I:T
-                self.itl_patterns.append({"edit_type": "add", "initiator": i.split(":")[0], "target": i.split(":")[1] })
+    path = regular_file_path(csv_in)
+    if jobs > 1 and path and multiline_fields(path, csv_in.encoding):
+        click.echo(click.style('Quoted fields span lines; converting in a single process', fg='yellow'), err=True)
+        jobs = 1
+    applications = ApplicationIndex()
+    index = DependencyIndex()
+    if jobs > 1 and path:
+        with profile.stage('convert'):
+            convert_parallel(path, csv_in.encoding, jobs, relation_entities, (), EntityWriter(None, indent=writer.indent),
+                             held=applications, index=index)
+    else:
+        add = profile.wrap('index', index.add_entity)
+        entities = relation_entities(mapped_lines(path, csv_in.encoding) if path else csv_in, applications)
+        for entity in profile.iterate('parse', entities):
+            add(entity)
+    for entity in applications:
+        index.add_entity(entity)
+
+    if applications.merged or applications.duplicates:
+        click.echo(click.style('{} Merged {} repeated application row(s); dropped {} duplicate ITL pattern(s)/device(s)'
+                               .format(success, applications.merged, applications.duplicates), fg='green'), err=True)
+
+    with profile.stage('resolve'):
+        unknown, cycles = index.resolve()
+    if unknown:
+        click.echo(click.style(fail, fg='red' if strict else 'yellow'), nl=False, err=True)
+        click.echo(click.style('{} reference(s) to entities not defined in the input'.format(len(unknown)), fg='cyan'),
+                   err=True)
+        for name, reference in unknown[:10]:
+            click.echo(click.style('  {} -> {}'.format(name, reference), fg='yellow'), err=True)
+        if len(unknown) > 10:
+            click.echo(click.style('  ... and {} more'.format(len(unknown) - 10), fg='yellow'), err=True)
+    if cycles:
+        click.echo(click.style(fail, fg='red'), nl=False, err=True)
+        click.echo(click.style('{} reference cycle(s)'.format(len(cycles)), fg='cyan'), err=True)
+        for cycle in cycles[:10]:
+            click.echo(click.style('  ' + ' -> '.join(cycle), fg='yellow'), err=True)
+    if cycles or (strict and unknown):
+        return False
+
+    with profile.stage('write'), writer:
+        for entity in index.ordered():
+            if isinstance(entity, str):
+                writer.write_fragment(entity)
             else:
-                self.devices['add'].append(i)
-        if len(self.itl_patterns) < 1:
-            del(self.itl_patterns)
-        if len(self.devices['add']) < 1:
-            del(self.devices)
-
-    def __lt__(self, other):
-        return self.name < other.name
-
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=False, indent=2)
-
-
-class Top:
-    def __init__(self):
-        self.version = 2
-        self.entities = []
-
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=False, indent=2)
+                writer.write(entity)
+    return True
 
 
 @click.command('vw_csv_relations_to_json', short_help='Convert CSV entities to importable JSON')
+@relation_options
 @click.argument('csv_in', type=click.File('r'))
 @click.argument('json_out', type=click.File('w'))
-def main(csv_in, json_out):
+def main(pretty, jobs, strict, profile_format, cprofile, csv_in, json_out):
     """
     This script generates an importable JSON file from a CSV file containing
     entity definitions.
@@ -78,7 +141,20 @@ def main(csv_in, json_out):
 
     Type is one of: application, hba, host, storagearray, storagecontroller, iomodule.
 
-    Tags is a semicolon-separated list of words.
+    Tags is a semicolon-separated list of words. Fields containing commas
+    may be enclosed in double quotes.
+
+    An application may be defined on several rows; its rows are merged into
+    one entity (tags and members combined) written after all other
+    entities, and repeated ITL patterns and devices are dropped. The number
+    of merged rows and dropped duplicates is reported on stderr.
+
+    Entities are written in dependency order (hbas, then hosts, then
+    applications), so every entity comes after the entities it refers to.
+    Members that refer to an entity not defined in the input are reported
+    as warnings (errors with --strict), except for hba members, which are
+    usually ports. Reference cycles are errors; no output is written if
+    there are errors.
 
     Example
 
@@ -90,46 +166,34 @@ def main(csv_in, json_out):
     application,app1,tag6;tag7,host1,host2
 
     Output is a JSON file that can be imported into VirtualWisdom, either via
-    the UI or via the command line using the vw_import_entities script.
+    the UI or via the command line using the vw_import_entities script. The
+    JSON is written in compact form; use --pretty (-p) for indented output.
 
     The command is pipeable; simply replace either the input file, output file,
     or both with a dash (-).
 
+    Large input files can be converted on several CPU cores with --jobs (-j);
+    the output is the same as with a single process. Input read from a pipe,
+    and files with quoted fields that span lines, are always converted by a
+    single process. Regular input files are read through a memory mapping.
+
+    Unlike vw_csv_nicknames_to_json, this command has no --cache: every
+    entity has to be indexed and ordered again on each run, which takes
+    longer than converting the blocks a cache would skip.
+
+    --profile table (or json, for JSON lines) reports the time spent
+    parsing, building and writing entities on stderr; --cprofile FILE saves
+    cProfile statistics for the run.
+
     Examples (Linux/macOS/Unix):
 
     (venv) $ vw_csv_relations_to_json relations.csv import.json
 
     (venv) $ cat relations.csv | vw_csv_relations_to_json - - | vw_import_entities ... -
     """
-    if os.name == 'nt':
-        success = 'success'
-        fail = 'fail '
-    else:
-        success = b'\xe2\x9c\x94'.decode('utf-8')
-        fail = b'\xe2\x9c\x98'.decode('utf-8') + ' '
-
-
-    top = Top()
-
-    for line in csv_in:
-        if line.count(',') < 2:
-            continue
-        etype = line.split(',')[0].strip().replace("'", '').replace('"', '')
-        name = line.split(',')[1].strip().replace("'", '').replace('"', '')
-        tag_line = line.replace("'", '').replace('"', '').split(',')[2].split(';')
-        if tag_line[0] == '':
-            tags = []
-        else:
-            tags = tag_line
-        members = []
-        for member in line.replace("'", '').replace('"', '').split(',')[3:]:
-            members.append(member.strip())
-        if etype.lower() == 'application':
-            top.entities.append(ApplicationEntity(name, etype, tags, members))
-        else:
-            top.entities.append(Entity(name, etype, tags, members))
-
-    json_out.write(top.to_JSON())
+    profile = cli_profile(profile_format, cprofile)
+    if not convert_relations(csv_in, EntityWriter(json_out, indent=2 if pretty else None), jobs, strict, profile):
+        exit(1)
     json_out.write('\n')
 
 
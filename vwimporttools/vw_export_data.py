@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+import click
+import json
+import os
+import sys
+from vwimporttools.vwexportutils import (EXPORT_FORMATS, REPORT_FIELDS, export_format, export_report, open_writer,
+                                         parse_time, parse_window, time_windows)
+from vwimporttools.vwtokenutils import Poller, VWtokenutils
+
+
+def _convert(convert, value):
+    try:
+        return convert(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+@click.command('vw_export_data', short_help='Export report data to NDJSON, CSV or Parquet')
+@click.option('--host', '-h', prompt='VW hostname or IP', envvar='VI_IPADDR')
+@click.option('--token', '-t', prompt='VW API token', envvar='VI_TOKEN')
+@click.option('--payload', '-P', type=click.File('r'), required=True, help='reportBatch request body (JSON)')
+@click.option('--start', '-s', required=True, help='Start of the range (epoch ms or ISO 8601, UTC)')
+@click.option('--end', '-e', required=True, help='End of the range (epoch ms or ISO 8601, UTC)')
+@click.option('--window', '-w', default='1h', show_default=True, help='Length of each request, e.g. 15m, 1h, 1d')
+@click.option('--format', '-f', 'fmt', type=click.Choice(EXPORT_FORMATS),
+              help='Output format  [default: from the OUTPUT extension, else ndjson]')
+@click.option('--parallel', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of windows requested at a time')
+@click.option('--start-field', default='startTime', show_default=True, help='Payload field set to each window start')
+@click.option('--end-field', default='endTime', show_default=True, help='Payload field set to each window end')
+@click.option('--timeout', type=click.FloatRange(min=0), help='Give up waiting for a report after SECONDS')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+def main(host, token, payload, start, end, window, fmt, parallel, start_field, end_field, timeout, output):
+    """
+    This script exports report data from VirtualWisdom to a file. The time
+    range from --start to --end is split into windows of --window each; a
+    report is requested for every window and its rows are written to
+    OUTPUT as soon as the window is complete, so memory use is bounded by
+    the windows in flight (--parallel, default 1) rather than the range.
+
+    The report is described by a reportBatch request body in JSON (see the
+    VW REST API documentation), given with --payload (-P); its chartType
+    must be one of topxtrend, topxcard, topxtable or histogram. For every
+    window, the window's start and end (epoch milliseconds) are set in the
+    payload's startTime and endTime fields (see --start-field and
+    --end-field).
+
+    Rows are written as NDJSON, CSV or, when pyarrow is installed, Parquet
+    (one row group per window). The format follows the extension of OUTPUT
+    (.ndjson, .jsonl, .csv, .parquet) unless --format (-f) is given. NDJSON
+    and CSV can be written to standard output with a dash (-).
+
+    Examples (Linux/macOS/Unix):
+
+    (venv) $ vw_export_data -h 10.20.30.40 -t <token> -P trend.json -s 2021-11-01 -e 2021-11-08 -w 1h trend.csv
+
+    (venv) $ vw_export_data -P trend.json -s 2021-11-01 -e 2021-12-01 -w 1d -j 4 trend.parquet
+
+    Progress is reported on stderr. The VI_IPADDR and VI_TOKEN environment
+    variables can be used instead of -h and -t.
+    """
+    if os.name == 'nt':
+        success = 'success'
+        fail = 'fail '
+    else:
+        success = b'\xe2\x9c\x94'.decode('utf-8')
+        fail = b'\xe2\x9c\x98'.decode('utf-8') + ' '
+
+    start = _convert(parse_time, start)
+    end = _convert(parse_time, end)
+    window = _convert(parse_window, window)
+    if end <= start:
+        raise click.BadParameter('--end must be after --start')
+    try:
+        payload = json.load(payload)
+    except ValueError as e:
+        raise click.BadParameter('payload is not valid JSON: {}'.format(e))
+    if not isinstance(payload, dict) or payload.get('chartType') not in REPORT_FIELDS:
+        raise click.BadParameter('payload chartType must be one of {}'.format(', '.join(REPORT_FIELDS)))
+    fmt = export_format(output, fmt)
+    if fmt == 'parquet' and output == '-':
+        raise click.BadParameter('Parquet cannot be written to standard output')
+
+    if output == '-':
+        f = sys.stdout
+    elif fmt == 'parquet':
+        f = None
+    else:
+        f = open(output, 'w', newline='', encoding='utf-8')
+    try:
+        writer = open_writer(fmt, f if f is not None else output, payload['chartType'])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    windows = list(time_windows(start, end, window))
+    done = [0]
+
+    def progress(w, rows):
+        done[0] += 1
+        click.echo('Window {}/{} ({} rows)'.format(done[0], len(windows), rows), err=True)
+
+    vw = VWtokenutils(host, token, Poller(deadline=timeout), pool_maxsize=max(10, parallel))
+    try:
+        rc, res = export_report(vw, payload, windows, writer, start_field, end_field, parallel, progress)
+    finally:
+        writer.close()
+        if f is not None and output != '-':
+            f.close()
+
+    if rc:
+        click.echo(click.style(success, fg='green'), nl=False, err=True)
+        click.echo(' Exported {rows} rows in {windows} windows'.format(**res), err=True)
+    else:
+        click.echo(click.style(fail, fg='red'), nl=False, err=True)
+        click.echo(click.style(res, fg='cyan'), err=True)
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+import click
+import sys
+from vwimporttools.vw_csv_nicknames_to_json import convert_nicknames, nickname_options
+from vwimporttools.vw_csv_relations_to_json import convert_relations, relation_options
+from vwimporttools.vw_import_entities import import_entities, import_options
+from vwimporttools.vwjsonutils import DocumentWriter, EntityDocument, EntityWriter
+from vwimporttools.vwprofileutils import cli_profile
+
+OUTPUT_HELP = 'Write the JSON to FILE instead of passing the entities on to the following steps'
+
+
+@click.group('vwimport', chain=True)
+@click.pass_context
+def main(ctx):
+    """
+    Converts and imports entities in a single process. The commands work
+    like vw_csv_nicknames_to_json, vw_csv_relations_to_json and
+    vw_import_entities, take the same options, and can be given one after
+    the other on the same command line.
+
+    The entities converted by convert-nicknames and convert-relations are
+    kept in memory and imported by a following import command, without
+    being written out as JSON and parsed again. The entities of several
+    convert commands are imported together (in dependency order with
+    --batch-size). A convert command given --output (-o) writes its JSON to
+    that file instead. Converted entities that no import command follows
+    are written to standard output as one JSON document.
+
+    Examples (Linux/macOS/Unix):
+
+    (venv) $ vwimport convert-nicknames -t hostport aliases.csv convert-relations relations.csv import -h 10.20.30.40 -t <token> -b 5000
+
+    (venv) $ vwimport convert-relations relations.csv > import.json
+
+    The import command must come last if it is not given a JSON_IN file.
+    """
+    ctx.obj = {'document': EntityDocument(), 'pretty': False}
+
+
+@main.command('convert-nicknames', short_help='Convert CSV nicknames to entities')
+@nickname_options
+@click.option('--output', '-o', type=click.File('w'), help=OUTPUT_HELP)
+@click.argument('csv_in', type=click.File('r'))
+@click.pass_obj
+def convert_nicknames_command(state, etype, pretty, jobs, cache_dir, cache_size, cache_block_size, profile_format,
+                              cprofile, output, csv_in):
+    """
+    Converts a WWN,nickname CSV file to aliases (see
+    vw_csv_nicknames_to_json --help).
+    """
+    profile = cli_profile(profile_format, cprofile)
+    if output:
+        convert_nicknames(csv_in, EntityWriter(output, indent=2 if pretty else None), etype, jobs, cache_dir,
+                          cache_size, cache_block_size, profile)
+        output.write('\n')
+    else:
+        state['pretty'] = state['pretty'] or pretty
+        convert_nicknames(csv_in, DocumentWriter(state['document'], etype), etype, jobs, cache_dir, cache_size,
+                          cache_block_size, profile)
+
+
+@main.command('convert-relations', short_help='Convert CSV entity definitions to entities')
+@relation_options
+@click.option('--output', '-o', type=click.File('w'), help=OUTPUT_HELP)
+@click.argument('csv_in', type=click.File('r'))
+@click.pass_obj
+def convert_relations_command(state, pretty, jobs, strict, profile_format, cprofile, output, csv_in):
+    """
+    Converts a Type,Name,Tags,Item1,...,ItemN CSV file to entities (see
+    vw_csv_relations_to_json --help).
+    """
+    profile = cli_profile(profile_format, cprofile)
+    if output:
+        if not convert_relations(csv_in, EntityWriter(output, indent=2 if pretty else None), jobs, strict, profile):
+            exit(1)
+        output.write('\n')
+    else:
+        state['pretty'] = state['pretty'] or pretty
+        if not convert_relations(csv_in, DocumentWriter(state['document']), jobs, strict, profile):
+            exit(1)
+
+
+@main.command('import', short_help='Import entities into VirtualWisdom')
+@import_options
+@click.argument('json_in', type=click.File('r'), required=False)
+@click.pass_obj
+def import_command(state, host, hosts_file, token, force, batch_size, workers, pretty, compress, timeout, entity_cache,
+                   entity_cache_ttl, delta, prune, journal, resume, profile_format, cprofile, json_in):
+    """
+    Imports the entities converted by the commands before it, or JSON_IN
+    (see vw_import_entities --help).
+    """
+    document = state['document']
+    if json_in is not None and len(document):
+        raise click.UsageError('import takes either JSON_IN or the entities converted before it, not both')
+    if json_in is None and not len(document):
+        raise click.UsageError('nothing to import; give JSON_IN or convert entities first')
+    state['document'] = EntityDocument()
+    import_entities(json_in, host, hosts_file, token, force, batch_size, workers, pretty, compress, timeout,
+                    entity_cache, entity_cache_ttl, delta, prune, journal, resume, profile_format, cprofile,
+                    document=document if json_in is None else None)
+
+
+@main.result_callback()
+@click.pass_obj
+def write_remaining(state, results):
+    """
+    Writes the entities no import command took to standard output, and
+    passes the results of the chained commands through.
+    """
+    document = state['document']
+    if len(document):
+        with EntityWriter(sys.stdout, indent=2 if state['pretty'] else None) as writer:
+            if state['pretty']:
+                for entity in document.entities():
+                    writer.write(entity)
+            else:
+                writer.write_fragments(document.fragments)
+        sys.stdout.write('\n')
+    return results
+
+
+if __name__ == '__main__':
+    main()
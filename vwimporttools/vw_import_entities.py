@@ -10,23 +10,98 @@ __version__ = '1.0.1'
 import click
 import json
 import os
+import re
 import time
-from vwimporttools.vwtokenutils import VWtokenutils
+from concurrent.futures import ThreadPoolExecutor
+from vwimporttools.vwcacheutils import EntityCache
+from vwimporttools.vwdeltautils import compute_delta
+from vwimporttools.vwgraphutils import DependencyIndex, describe
+from vwimporttools.vwjournalutils import ImportJournal
+from vwimporttools.vwjsonutils import EntityDocument, read_document
+from vwimporttools.vwprofileutils import PROFILE_FORMATS, cli_profile
+from vwimporttools.vwtokenutils import Poller, VWtokenutils
+
+WWN_PATTERN = re.compile(r'^[0-9A-Fa-f]{16}$|^[0-9A-Fa-f]{2}([:-][0-9A-Fa-f]{2}){7}$')
+
+VERSION_MISMATCH = 'Provided JSON does not conform to VW entity import standard; version number mismatch'
+
+
+def check_entity(entity):
+    """
+    Returns a description of what is wrong with entity, or None if it has
+    the fields an import needs.
+    """
+    if not isinstance(entity, dict):
+        return 'not a JSON object'
+    if not entity.get('type'):
+        return 'missing type'
+    if 'new_name' in entity:
+        if not entity['new_name']:
+            return 'empty new_name'
+        if 'wwn' not in entity and not entity.get('name'):
+            return 'alias has neither wwn nor name'
+    elif not entity.get('name'):
+        return 'missing name'
+    if 'wwn' in entity and not WWN_PATTERN.match(str(entity['wwn'])):
+        return 'malformed WWN {!r}'.format(entity['wwn'])
+    return None
 
 
 def validate_input(json_in):
+    """
+    Validates the import document in json_in in a single streaming pass and
+    returns (True, EntityDocument) or (False, error message). Errors are
+    reported as soon as they are read, with the index of the entity
+    concerned. Entities given on one line are kept as they appear in
+    json_in, and top-level members other than version and entities are
+    carried through to the upload.
+    """
+    document = EntityDocument(None)
     try:
-        object_in = json.load(json_in)
+        for key, value, text in read_document(json_in, with_text=True):
+            if key == 'entities':
+                error = check_entity(value)
+                if error:
+                    return False, 'Entity {} ({}) is invalid: {}'.format(len(document),
+                        (value.get('name') or value.get('new_name') or '') if isinstance(value, dict) else '', error)
+                if '\n' in text:
+                    document.append(value)
+                else:
+                    document.append_fragment(text, value['type'])
+            elif key == 'version':
+                if value not in (2, '2'):
+                    return False, VERSION_MISMATCH
+                document.version = value
+            else:
+                document.extra[key] = value
     except ValueError as e:
-        return False, 'Provided JSON could not be parsed: {}'.format(str(e))
+        return False, 'Provided JSON could not be parsed after entity {}: {}'.format(len(document), str(e))
 
-    if 'version' not in object_in or object_in['version'] not in (2, '2'):
-        return False, 'Provided JSON does not conform to VW entity import standard; version number mismatch'
+    if document.version is None:
+        return False, VERSION_MISMATCH
 
-    if 'entities' not in object_in or len(object_in['entities']) == 0:
+    if len(document) == 0:
         return False, 'Provided JSON contains no entities'
 
-    return True, object_in
+    return True, document
+
+
+def validate_document(document):
+    """
+    Checks the entities of an EntityDocument built in this process (e.g. by
+    vwimport convert-nicknames) as validate_input does, and returns (True,
+    document) or (False, error message).
+    """
+    for position, entity in enumerate(document.entities()):
+        error = check_entity(entity)
+        if error:
+            return False, 'Entity {} ({}) is invalid: {}'.format(position,
+                entity.get('name') or entity.get('new_name') or '', error)
+
+    if len(document) == 0:
+        return False, 'No entities to import'
+
+    return True, document
 
 
 def parse_errors(errors_in):
@@ -51,46 +126,289 @@ def parse_errors(errors_in):
     return messages
 
 
-@click.command('vw_csv_relations_to_json', short_help='Convert CSV entities to importable JSON')
-@click.option('--host', '-h', prompt='VW hostname or IP', envvar='VI_IPADDR')
-@click.option('--token', '-t', prompt='VW API token', envvar='VI_TOKEN')
-@click.option('--force', '-F', is_flag=True)
-@click.argument('json_in', type=click.File('r'))
-def main(host, token, force, json_in):
+def response_errors(res):
     """
-    This script imports entities (or aliases) into VirtualWisdom. It does
-    so using VW's Public REST API. As such, it requires two things: (1) a
-    token generated from the VW UI (see Ch. 8 in the VW User Guide), and
-    (2) a REST API SDK license, properly installed in the target VW Appliance.
+    Returns a one-line description of a failed commit or status response:
+    the messages of its errors list, or those parse_errors finds, or the
+    response itself.
+    """
+    messages = []
+    if isinstance(res, dict):
+        for error in res.get('errors') or []:
+            if isinstance(error, dict):
+                messages.append(' ; '.join(str(error[k]) for k in ('code', 'message') if k in error) or str(error))
+            else:
+                messages.append(str(error))
+        if not messages:
+            messages = [m.strip() for m in parse_errors(res)]
+    return ' / '.join(messages) or str(res)
 
-    Input is a properly constructed JSON import file (see Ch. 8 in the VW
-    User Guide).
 
-    The command is pipeable; simply replace the input file with a dash (-).
+def document_index(document):
+    """
+    Returns a DependencyIndex of the positions of the entities in an
+    EntityDocument.
+    """
+    index = DependencyIndex()
+    for position, entity in enumerate(document.entities()):
+        index.add(position, *describe(entity))
+    return index
 
-    Examples (Linux/macOS/Unix):
 
-    (venv) $ vw_import_entities -h 10.20.30.40 -t <token> entities.json
+def split_batches(document, batch_size, index=None):
+    """
+    Splits an EntityDocument into chunks of at most batch_size entities,
+    grouped into tiers by dependency level (see DependencyIndex). Returns a
+    list of tiers, each a list of chunk documents; the chunks of one tier
+    may be imported concurrently, but every tier must complete before the
+    next one starts. index is the document's index if already built.
+    """
+    if index is None:
+        index = document_index(document)
+    return [[document.subset(tier[i:i + batch_size]) for i in range(0, len(tier), batch_size)]
+            for tier in index.levels()]
 
-    (venv) $ cat aliases.csv | vw_csv_nicknames_to_json - - | vw_import_entities -h 10.20.30.40 -t <token> -
 
-    If your input file has any errors, they will be listed to the screen.
+def start_import(vw, body, compress=False):
+    # an upload can take as long as its hundreds of MB take to send and
+    # validate, so only the connect is bounded
+    connect = vw.timeout[0] if isinstance(vw.timeout, tuple) else vw.timeout
+    rc, res = vw.post('/api/v1/entitiesimport/start', body, timeout=(connect, None), compress=compress)
+    transactionId = res['result'].get('transactionId') if isinstance(res, dict) and 'result' in res else None
+    if rc and 'status' in res and res['status'] == 'OK':
+        return True, transactionId, []
+    errors = parse_errors(res) if isinstance(res, dict) else []
+    return False, transactionId, errors or [str(res)]
 
-    You can set two environment variables to simplify the use of this script:
 
-    On Mac/Linux/Unix:
+def discard_import(vw, transactionId):
+    if transactionId != None:
+        _,_ = vw.delete('/api/v1/entitiesimport/discard',
+            '{"async": true, "transactionId": ' + str(transactionId) + '}'
+        )
 
-    \b
-    export VI_IPADDR=10.20.30.40
-    export VI_TOKEN=<token>
 
-    On Windows:
+def commit_import(vw, transactionId):
+    payload = { 'async' : True, 'transactionId' : transactionId }
+    rc, res = vw.put('/api/v1/entitiesimport/commit', json.dumps(payload))
+    if rc and 'status' in res and res['status'] == 'OK':
+        return True, None
+    return False, 'File commit failed: {}'.format(response_errors(res))
 
-    \b
-    set VI_IPADDR=10.20.30.40
-    set VI_TOKEN=<token>
 
-    Doing so eliminates the need to use the -h and -t options.
+def wait_for_import(vw, transactionId):
+    parameters = { 'transactionId' : transactionId }
+
+    def import_finished():
+        rc, res = vw.get('/api/v1/entitiesimport/status', parameters=parameters)
+        busy = rc and 'success' in res and res['success'] == False and 'status' in res and res['status'] == 'Busy'
+        return not busy, (rc, res)
+
+    finished, (rc, res) = vw.poller.run(import_finished)
+    if not finished:
+        return False, 'File import did not finish within {} seconds'.format(vw.poller.deadline)
+    if rc and 'success' in res and res['success'] == True:
+        vw.invalidate_entities()
+        return True, None
+    return False, 'File import failed: {}'.format(response_errors(res))
+
+
+def _resume_batch(vw, result, previous, key, journal):
+    # finishes an in-flight batch from a previous run; returns True if done
+    result['transactionId'] = previous['transactionId']
+    if previous['stage'] == 'start':
+        rc, _ = commit_import(vw, result['transactionId'])
+        if not rc:
+            return False
+        journal.record(key, 'commit', result['transactionId'], host=vw.host, count=result['count'])
+    rc, _ = wait_for_import(vw, result['transactionId'])
+    if not rc:
+        return False
+    journal.record(key, 'done', result['transactionId'], host=vw.host, count=result['count'])
+    return True
+
+
+def import_batch(vw, document, force, pretty=False, compress=False, journal=None, resume=False):
+    """
+    Runs the start/commit/status cycle for one chunk document. Returns a
+    dict describing the outcome: ok, the stage reached, the transactionId,
+    any error messages and whether the chunk was resumed.
+
+    With a journal (an ImportJournal), every stage reached is recorded
+    against the chunk's digest. With resume, a chunk the journal lists as
+    done is skipped, and one left in flight (started or committed) is
+    committed and/or polled again under its old transactionId; if that
+    fails, the chunk is imported again from the start.
+    """
+    result = {'ok': False, 'stage': 'start', 'transactionId': None, 'messages': [],
+              'count': len(document), 'type': '/'.join(sorted(set(document.types))), 'resumed': None}
+    key = document.digest() if journal is not None else None
+    previous = journal.last(key, vw.host) if journal is not None and resume else None
+    if previous is not None:
+        if previous['stage'] == 'done':
+            result.update(ok=True, stage='done', transactionId=previous['transactionId'], resumed='skipped')
+            return result
+        if previous['stage'] in ('start', 'commit'):
+            result['resumed'] = 'polled'
+            if _resume_batch(vw, result, previous, key, journal):
+                result.update(ok=True, stage='done')
+                return result
+            result['resumed'] = 'restarted'
+
+    with vw.profile.stage('upload'):
+        rc, result['transactionId'], result['messages'] = start_import(vw, document.body(pretty), compress)
+    if not rc and not force:
+        discard_import(vw, result['transactionId'])
+        if journal is not None:
+            journal.record(key, 'failed', result['transactionId'], host=vw.host, count=result['count'], at='start')
+        return result
+    if journal is not None:
+        journal.record(key, 'start', result['transactionId'], host=vw.host, count=result['count'])
+
+    result['stage'] = 'commit'
+    with vw.profile.stage('commit'):
+        rc, message = commit_import(vw, result['transactionId'])
+    if not rc:
+        result['messages'].append(message)
+        if journal is not None:
+            journal.record(key, 'failed', result['transactionId'], host=vw.host, count=result['count'], at='commit')
+        return result
+    if journal is not None:
+        journal.record(key, 'commit', result['transactionId'], host=vw.host, count=result['count'])
+
+    result['stage'] = 'status'
+    with vw.profile.stage('status'):
+        rc, message = wait_for_import(vw, result['transactionId'])
+    if not rc:
+        result['messages'].append(message)
+        # the import may still finish on the appliance; leave the chunk
+        # recorded as committed so that --resume polls it again
+        return result
+    if journal is not None:
+        journal.record(key, 'done', result['transactionId'], host=vw.host, count=result['count'])
+
+    result['stage'] = 'done'
+    result['ok'] = True
+    return result
+
+
+def import_batches(vw, tiers, workers, force, pretty=False, compress=False, journal=None, resume=False):
+    """
+    Imports the chunks produced by split_batches, running up to workers chunks
+    of the same tier at a time. Stops after the first tier with a failed
+    chunk unless force is set. Returns the list of per-chunk results in
+    import order. journal and resume are passed on to import_batch.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for tier in tiers:
+            tier_results = list(pool.map(
+                lambda chunk: import_batch(vw, chunk, force, pretty, compress, journal, resume), tier))
+            results.extend(tier_results)
+            if not force and not all(r['ok'] for r in tier_results):
+                break
+    return results
+
+
+def read_hosts(host, hosts_file=None):
+    """
+    Returns the (host, token or None) pairs to import into, from a
+    comma-separated host value and/or an open file listing one host per
+    line, optionally followed by its API token. Blank lines and lines
+    starting with # are skipped, as are repeated hosts.
+    """
+    targets = [(h.strip(), None) for h in (host or '').split(',') if h.strip()]
+    if hosts_file is not None:
+        for line in hosts_file:
+            fields = line.split()
+            if fields and not fields[0].startswith('#'):
+                targets.append((fields[0], fields[1] if len(fields) > 1 else None))
+    seen = set()
+    return [t for t in targets if not (t[0] in seen or seen.add(t[0]))]
+
+
+def import_host(vw, document, tiers, workers, force, pretty=False, compress=False, delta=False, prune=False,
+                batch_size=None, journal=None, resume=False):
+    """
+    Runs a whole import into the appliance behind vw without printing
+    anything, so that several appliances can be imported into at once.
+    tiers are the chunks of document from split_batches (or [[document]]);
+    with delta they are rebuilt from this appliance's changes instead.
+    Returns a summary dict: host, ok, chunks, imported (chunks), entities
+    (imported), total, seconds and a message describing the first failure.
+    """
+    start = time.monotonic()
+    summary = {'host': vw.host, 'ok': False, 'chunks': 0, 'imported': 0, 'entities': 0, 'total': len(document),
+               'seconds': 0.0, 'message': ''}
+    unknown = []
+    if delta:
+        rc, changes = compute_delta(vw, document.entities(), prune, unknown)
+        if not rc:
+            summary['message'] = changes
+            summary['seconds'] = time.monotonic() - start
+            return summary
+        document = EntityDocument(document.version, document.extra)
+        for entity in changes:
+            document.append(entity)
+        tiers = split_batches(document, batch_size) if batch_size else [[document]] if changes else []
+        summary['total'] = len(document)
+
+    results = import_batches(vw, tiers, workers, force, pretty, compress, journal, resume)
+    summary['chunks'] = sum(len(tier) for tier in tiers)
+    summary['imported'] = sum(1 for r in results if r['ok'])
+    summary['entities'] = sum(r['count'] for r in results if r['ok'])
+    summary['ok'] = summary['imported'] == summary['chunks']
+    failed = next((r for r in results if not r['ok']), None)
+    if failed is not None:
+        summary['message'] = 'failed at {}{}'.format(failed['stage'],
+                                                     ': ' + failed['messages'][0] if failed['messages'] else '')
+    elif delta and not summary['chunks']:
+        summary['message'] = 'no changes'
+    if unknown and failed is None:
+        note = '{} entities not fully compared'.format(len(unknown))
+        summary['message'] = summary['message'] + '; ' + note if summary['message'] else note
+    summary['seconds'] = time.monotonic() - start
+    return summary
+
+
+def import_options(f):
+    """
+    Adds the options shared by vw_import_entities and vwimport import.
+    """
+    for option in reversed((
+        click.option('--host', '-h', envvar='VI_IPADDR', help='VW hostname or IP; several may be separated by commas'),
+        click.option('--hosts-file', '-H', type=click.File('r'),
+                     help='Also import into every host in FILE (one per line, optionally followed by its token)'),
+        click.option('--token', '-t', envvar='VI_TOKEN'),
+        click.option('--force', '-F', is_flag=True),
+        click.option('--batch-size', '-b', type=click.IntRange(min=1), help='Import in chunks of at most N entities'),
+        click.option('--workers', '-w', type=click.IntRange(min=1), default=4, show_default=True,
+                     help='Number of chunks imported concurrently with --batch-size'),
+        click.option('--pretty', '-p', is_flag=True, help='Upload indented JSON so error locations are readable'),
+        click.option('--gzip', '-z', 'compress', is_flag=True, help='Gzip-compress the uploaded JSON'),
+        click.option('--timeout', type=click.FloatRange(min=0), help='Give up waiting for an import after SECONDS'),
+        click.option('--entity-cache', envvar='VI_ENTITY_CACHE', type=click.Path(dir_okay=False),
+                     help='Cache the entities --delta reads in FILE; invalidated after a successful import'),
+        click.option('--entity-cache-ttl', envvar='VI_ENTITY_CACHE_TTL', type=click.FloatRange(min=0), default=300,
+                     show_default=True, help='Seconds an --entity-cache entry is used for'),
+        click.option('--delta', '-d', is_flag=True, help='Only upload entities that differ from the appliance'),
+        click.option('--prune', is_flag=True, help='With --delta, also remove members the input does not list'),
+        click.option('--journal', type=click.Path(dir_okay=False), help='Record the progress of every chunk in FILE'),
+        click.option('--resume', '-r', is_flag=True, help='With --journal, skip chunks already imported and finish in-flight ones'),
+        click.option('--profile', 'profile_format', type=click.Choice(PROFILE_FORMATS),
+                     help='Report stage timings and request statistics on stderr'),
+        click.option('--cprofile', type=click.Path(dir_okay=False), help='Write cProfile statistics to FILE'),
+    )):
+        f = option(f)
+    return f
+
+
+def import_entities(json_in, host, hosts_file, token, force, batch_size, workers, pretty, compress, timeout, entity_cache,
+                    entity_cache_ttl, delta, prune, journal, resume, profile_format, cprofile, document=None):
+    """
+    Validates and imports json_in, or the EntityDocument document if one
+    is given, reporting progress and errors as vw_import_entities does.
+    Returns when the import is done; exits on errors.
     """
     if os.name == 'nt':
         success = 'success'
@@ -99,61 +417,273 @@ def main(host, token, force, json_in):
         success = b'\xe2\x9c\x94'.decode('utf-8')
         fail = b'\xe2\x9c\x98'.decode('utf-8') + ' '
 
-    vw = VWtokenutils(host, token)
+    if resume and not journal:
+        raise click.UsageError('--resume requires --journal')
+
+    targets = read_hosts(host, hosts_file)
+    if not targets:
+        targets = read_hosts(click.prompt('VW hostname or IP'))
+    if not token and any(t is None for _, t in targets):
+        token = click.prompt('VW API token')
+    targets = [(h, t or token) for h, t in targets]
+
+    profile = cli_profile(profile_format, cprofile)
+    cache = EntityCache(ttl=entity_cache_ttl, path=entity_cache) if entity_cache else None
+    clients = [VWtokenutils(h, t, Poller(deadline=timeout), pool_maxsize=max(10, workers), cache=cache, profile=profile)
+               for h, t in targets]
+    vw = clients[0]
 
     click.echo('Validating input... ', nl=False)
-    rc, res = validate_input(json_in)
+    with profile.stage('validate'):
+        rc, res = validate_input(json_in) if document is None else validate_document(document)
     if rc:
         click.echo(click.style(success, fg='green'))
     else:
         click.echo(click.style(fail, fg='red'), nl=False)
         click.echo(click.style(res, fg='cyan'))
-        exit()
+        exit(1)
+
+    if journal:
+        journal = ImportJournal(journal)
+
+    if len(clients) > 1:
+        tiers = [[res]]
+        if batch_size:
+            with profile.stage('index'):
+                index = document_index(res)
+                _, cycles = index.resolve()
+            if cycles:
+                click.echo(click.style(fail, fg='red'), nl=False)
+                click.echo(click.style('{} reference cycle(s) in input'.format(len(cycles)), fg='cyan'))
+                for cycle in cycles[:10]:
+                    click.echo(click.style('  ' + ' -> '.join(cycle), fg='yellow'))
+                if not force:
+                    exit(1)
+            tiers = split_batches(res, batch_size, index)
+        if not delta:
+            # every appliance gets the same bytes
+            with profile.stage('serialize'):
+                for tier in tiers:
+                    for chunk in tier:
+                        chunk.render(pretty)
+
+        click.echo('Importing into {} appliances...'.format(len(clients)))
+        with profile.stage('import'), ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            futures = [pool.submit(import_host, client, res, tiers, workers, force, pretty, compress, delta, prune,
+                                   batch_size, journal, resume) for client in clients]
+        summaries = []
+        for client, future in zip(clients, futures):
+            try:
+                summaries.append(future.result())
+            except Exception as err:
+                summaries.append({'host': client.host, 'ok': False, 'chunks': 0, 'imported': 0, 'entities': 0,
+                                  'total': len(res), 'seconds': 0.0, 'message': str(err)})
+        if journal:
+            journal.close()
+
+        width = max(len('Host'), max(len(r['host']) for r in summaries))
+        click.echo('{:<{w}}  {:<7} {:>9} {:>17} {:>9}  {}'.format('Host', 'Result', 'Chunks', 'Entities', 'Seconds',
+                                                                  'Detail', w=width))
+        for r in summaries:
+            click.echo('{:<{w}}  '.format(r['host'], w=width), nl=False)
+            click.echo(click.style('{:<7}'.format(success if r['ok'] else fail.strip()),
+                                   fg='green' if r['ok'] else 'red'), nl=False)
+            click.echo(' {:>9} {:>17} {:>9.2f}  '.format('{}/{}'.format(r['imported'], r['chunks']),
+                                                        '{}/{}'.format(r['entities'], r['total']), r['seconds']),
+                       nl=False)
+            click.echo(click.style(r['message'], fg='yellow' if r['ok'] else 'cyan'))
+        succeeded = sum(1 for r in summaries if r['ok'])
+        click.echo('{} of {} appliances imported'.format(succeeded, len(summaries)))
+        if succeeded < len(summaries):
+            exit(1)
+        return
+
+    if delta:
+        click.echo('Comparing with current entities... ', nl=False)
+        unknown = []
+        with profile.stage('delta'):
+            rc, changes = compute_delta(vw, res.entities(), prune, unknown)
+        if not rc:
+            click.echo(click.style(fail, fg='red'), nl=False)
+            click.echo(click.style(changes, fg='cyan'))
+            exit(1)
+        click.echo(click.style(success, fg='green'))
+        click.echo('{} of {} entities changed'.format(len(changes), len(res)))
+        if unknown:
+            click.echo(click.style('{} entities have members or tags the appliance did not return; those were not '
+                                   'compared'.format(len(unknown)), fg='yellow'))
+        if cache is not None:
+            click.echo('Entity cache: {hits} hits, {misses} misses'.format(**cache.stats()))
+        if not changes:
+            return
+        document = EntityDocument(res.version, res.extra)
+        for entity in changes:
+            document.append(entity)
+        res = document
+
+    if batch_size or journal:
+        if batch_size:
+            with profile.stage('index'):
+                index = document_index(res)
+                _, cycles = index.resolve()
+            if cycles:
+                click.echo(click.style(fail, fg='red'), nl=False)
+                click.echo(click.style('{} reference cycle(s) in input'.format(len(cycles)), fg='cyan'))
+                for cycle in cycles[:10]:
+                    click.echo(click.style('  ' + ' -> '.join(cycle), fg='yellow'))
+                if not force:
+                    exit(1)
+            click.echo('Importing in chunks of {} entities...'.format(batch_size))
+            tiers = split_batches(res, batch_size, index)
+        else:
+            click.echo('Importing as one chunk...')
+            tiers = [[res]]
+        with profile.stage('import'):
+            results = import_batches(vw, tiers, workers, force, pretty, compress, journal, resume)
+        if journal:
+            journal.close()
+        for i, r in enumerate(results, 1):
+            click.echo('  Chunk {} ({} x {}, transaction {}) '.format(i, r['count'], r['type'], r['transactionId']), nl=False)
+            if r['ok']:
+                click.echo(click.style(success, fg='green'), nl=not r['resumed'])
+                if r['resumed']:
+                    click.echo(click.style(' ({})'.format(r['resumed']), fg='cyan'))
+            else:
+                click.echo(click.style(fail, fg='red'), nl=False)
+                click.echo(click.style('failed at {}'.format(r['stage']), fg='cyan'))
+                for e in r['messages']:
+                    click.echo(click.style('    ' + e, fg='yellow'))
+        total = sum(len(tier) for tier in tiers)
+        imported = sum(1 for r in results if r['ok'])
+        click.echo('{} of {} chunks imported ({} of {} entities)'.format(imported, total,
+            sum(r['count'] for r in results if r['ok']), len(res)))
+        if imported < total:
+            exit(1)
+        return
 
     click.echo('Uploading and verifying JSON... ', nl=False)
-    rc, res = vw.post('/api/v1/entitiesimport/start', json.dumps(res, sort_keys=True, indent=2))
-    if rc and 'status' in res and res['status'] == 'OK':
-        transactionId = res['result']['transactionId']
+    with profile.stage('upload'):
+        rc, transactionId, errors = start_import(vw, res.body(pretty), compress)
+    if rc:
         click.echo(click.style(success, fg='green'))
     else:
-        transactionId = res['result']['transactionId']
         click.echo(click.style(fail, fg='red'), nl=False)
-        errors = parse_errors(res)
         click.echo(click.style(errors[0], fg='cyan'))
         for e in errors[1:]:
             click.echo(click.style(e, fg='yellow'))
         if not force:
-            if transactionId != None:
-                _,_ = vw.delete('/api/v1/entitiesimport/discard',
-                    '{"async": true, "transactionId": ' + str(transactionId) + '}'
-                )
-            exit()
+            discard_import(vw, transactionId)
+            exit(1)
 
     click.echo('Committing JSON... ', nl=False)
-    payload = { 'async' : True, 'transactionId' : transactionId }
-    rc, res = vw.put('/api/v1/entitiesimport/commit', json.dumps(payload))
-    if rc and 'status' in res and res['status'] == 'OK':
+    with profile.stage('commit'):
+        rc, message = commit_import(vw, transactionId)
+    if rc:
         click.echo(click.style(success, fg='green'))
     else:
         click.echo(click.style(fail, fg='red'), nl=False)
-        click.echo(click.style('File commit failed: {}'.format(res['errors']['message']), fg='cyan'))
-        exit()
+        click.echo(click.style(message, fg='cyan'))
+        exit(1)
 
     click.echo('Performing final verification... ', nl=False)
-    parameters = { 'transactionId' : transactionId }
-    while True:
-        rc, res = vw.get('/api/v1/entitiesimport/status', parameters=parameters)
-        if rc and 'success' in res and res['success'] == False and 'status' in res and res['status'] == 'Busy':
-            time.sleep(1)
-            continue
-        else:
-            break
-    if rc and 'success' in res and res['success'] == True:
+    with profile.stage('status'):
+        rc, message = wait_for_import(vw, transactionId)
+    if rc:
         click.echo(click.style(success, fg='green'))
     else:
         click.echo(click.style(fail, fg='red'), nl=False)
-        click.echo(click.style('File import failed: {}'.format(res['errors']['message']), fg='cyan'))
-        exit()
+        click.echo(click.style(message, fg='cyan'))
+        exit(1)
+
+
+@click.command('vw_csv_relations_to_json', short_help='Convert CSV entities to importable JSON')
+@import_options
+@click.argument('json_in', type=click.File('r'))
+def main(host, hosts_file, token, force, batch_size, workers, pretty, compress, timeout, entity_cache, entity_cache_ttl,
+         delta, prune, journal, resume, profile_format, cprofile, json_in):
+    """
+    This script imports entities (or aliases) into VirtualWisdom. It does
+    so using VW's Public REST API. As such, it requires two things: (1) a
+    token generated from the VW UI (see Ch. 8 in the VW User Guide), and
+    (2) a REST API SDK license, properly installed in the target VW Appliance.
+
+    Input is a properly constructed JSON import file (see Ch. 8 in the VW
+    User Guide).
+
+    The command is pipeable; simply replace the input file with a dash (-).
+
+    Examples (Linux/macOS/Unix):
+
+    (venv) $ vw_import_entities -h 10.20.30.40 -t <token> entities.json
+
+    (venv) $ cat aliases.csv | vw_csv_nicknames_to_json - - | vw_import_entities -h 10.20.30.40 -t <token> -
+
+    If your input file has any errors, they will be listed to the screen.
+
+    You can set two environment variables to simplify the use of this script:
+
+    On Mac/Linux/Unix:
+
+    \b
+    export VI_IPADDR=10.20.30.40
+    export VI_TOKEN=<token>
+
+    On Windows:
+
+    \b
+    set VI_IPADDR=10.20.30.40
+    set VI_TOKEN=<token>
+
+    Doing so eliminates the need to use the -h and -t options.
+
+    Very large files can be imported in chunks with --batch-size (-b). Each
+    chunk gets its own import transaction; chunks are imported in dependency
+    order (ports, then hbas, then hosts, then applications, then anything
+    that refers to an application), and up to --workers (-w) chunks of the
+    same tier run at a time. Inputs with reference cycles are not imported
+    in chunks unless --force (-F) is given.
+
+    (venv) $ vw_import_entities -h 10.20.30.40 -t <token> -b 5000 -w 8 entities.json
+
+    JSON is uploaded in compact form. Use --pretty (-p) to upload indented
+    JSON, which makes the line and column of reported errors meaningful, and
+    --gzip (-z) to compress the upload if the appliance accepts
+    gzip-encoded requests.
+
+    With --delta (-d), the current entities of every type in the input are
+    read from the appliance first, and only new or changed entities (and
+    only the missing members of changed ones) are uploaded. Adding --prune
+    also removes members that are on the appliance but not in the input.
+    Members and tags the appliance does not return are not compared, and
+    the entities they belong to are counted as not fully compared.
+
+    With --journal FILE, the stage every chunk reaches (or, without
+    --batch-size, the whole file) is appended to FILE as it happens. If an
+    import is interrupted, run the same command again with --resume (-r):
+    chunks the journal lists as imported are skipped, chunks that were
+    uploaded or committed are committed and/or polled again under their
+    transaction, and the rest are imported as usual.
+
+    (venv) $ vw_import_entities -h 10.20.30.40 -t <token> -b 5000 --journal import.journal entities.json
+
+    (venv) $ vw_import_entities -h 10.20.30.40 -t <token> -b 5000 --journal import.journal -r entities.json
+
+    --profile table (or json, for JSON lines) reports the time spent in
+    each stage and, per HTTP verb, the number of requests, their latency,
+    bytes sent and received, retries and errors on stderr. --cprofile FILE
+    saves cProfile statistics for the run.
+
+    To import the same file into several appliances, list them with
+    --host (-h) separated by commas, or in a file given with --hosts-file
+    (-H), one per line and optionally followed by that appliance's token
+    (--token is used for the others). The input is validated, split and
+    serialized once, every appliance is imported into concurrently, and a
+    table of per-appliance results is printed at the end.
+
+    (venv) $ vw_import_entities -h vw1,vw2,vw3 -t <token> -b 5000 entities.json
+    """
+    import_entities(json_in, host, hosts_file, token, force, batch_size, workers, pretty, compress, timeout, entity_cache,
+                    entity_cache_ttl, delta, prune, journal, resume, profile_format, cprofile)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from vwimporttools.vwtokenutils import VWtokenutils
+
+
+class AsyncVWtokenutils:
+    """
+    asyncio counterpart of VWtokenutils with the same get/put/post/delete/
+    get_data/get_entities methods as coroutines. Each HTTP request runs on a
+    worker thread over the wrapped VWtokenutils session, while report polling
+    sleeps in the event loop, so many report batches can be in flight at
+    once. At most `concurrency` get_data calls run at a time.
+
+        async with AsyncVWtokenutils(host, token, concurrency=20) as vw:
+            results = await vw.gather_data(payloads)
+    """
+
+    def __init__(self, h, t, concurrency=10, poller=None, cache=None, profile=None):
+        self.vw = VWtokenutils(h, t, poller, pool_maxsize=max(10, concurrency), cache=cache, profile=profile)
+        self.poller = self.vw.poller
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    @property
+    def semaphore(self):
+        # created lazily so that it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get(self, endpoint, parameters=None, timeout=None):
+        return await self._run(self.vw.get, endpoint, parameters, timeout)
+
+    async def put(self, endpoint, payload=None, parameters=None, compress=False, timeout=None):
+        return await self._run(self.vw.put, endpoint, payload, parameters, compress, timeout)
+
+    async def post(self, endpoint, payload, timeout=None, compress=False):
+        return await self._run(self.vw.post, endpoint, payload, timeout, compress)
+
+    async def delete(self, endpoint, payload=None, parameters=None, timeout=None):
+        return await self._run(self.vw.delete, endpoint, payload, parameters, timeout)
+
+    async def poll(self, func):
+        """
+        Async version of Poller.run(): awaits func, which must return
+        (done, value), sleeping in the event loop between calls on the
+        poller's schedule.
+        """
+        waits = self.poller.waits(time.monotonic())
+        while True:
+            before = time.monotonic()
+            done, value = await func()
+            self.poller.record(time.monotonic() - before)
+            if done:
+                return True, value
+            delay = next(waits, None)
+            if delay is None:
+                return False, value
+            await asyncio.sleep(delay)
+
+    async def get_data(self, payload, columnar=False):
+        async with self.semaphore:
+            rc, uuid = await self.put('/api/v1/reports/reportBatch', json.dumps(payload))
+            if not rc:
+                return False, 'reportBatch request failed ({})'.format(uuid)
+            parameters = { 'uuid' : uuid }
+
+            async def report_finished():
+                rc, res = await self.get('/api/v1/reports/reportPoll', parameters)
+                return rc and 'finished' in res and res['finished'], res
+
+            data_recvd, res = await self.poll(report_finished)
+        if not data_recvd:
+            return False, 'reportPoll did not finish within {} seconds'.format(self.poller.deadline)
+        return self.vw.process_report(payload, res, columnar)
+
+    async def gather_data(self, payloads, columnar=False):
+        """
+        Runs get_data for every payload concurrently and returns the
+        (rc, result) pairs in the same order as payloads.
+        """
+        return await asyncio.gather(*(self.get_data(p, columnar) for p in payloads))
+
+    async def get_entities(self, kind, filterType='EXACT_MATCH', filterText=None):
+        return await self._run(self.vw.get_entities, kind, filterType, filterText)
@@ -0,0 +1,220 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# BlockCache entries are named after a sha256 hex digest
+ENTRY_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+class EntityCache:
+    """
+    TTL + LRU cache for VWtokenutils.get_entities results, keyed on
+    (host, kind, filterType, filterText). Entries expire ttl seconds after
+    they were stored, and the least recently used entries are evicted once
+    more than maxsize are held.
+
+    If path is given, entries are also kept, as JSON, in a SQLite file so
+    that separate CLI runs can share them; the in-memory LRU sits in front
+    of it. Rows that do not hold valid JSON are dropped as misses.
+    """
+
+    def __init__(self, ttl=300, maxsize=128, path=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            import sqlite3
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS entities '
+                            '(key TEXT PRIMARY KEY, host TEXT, expires REAL, used REAL, value TEXT)')
+            self.db.commit()
+
+    @staticmethod
+    def _db_key(key):
+        return json.dumps(list(key))
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.db is not None:
+                row = self.db.execute('SELECT expires, value FROM entities WHERE key = ?', (self._db_key(key),)).fetchone()
+                if row is not None:
+                    try:
+                        entry = (row[0], json.loads(row[1]))
+                    except (TypeError, ValueError):
+                        entry = (0, None)
+                    self.entries[key] = entry
+                    self._trim()
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            if self.db is not None:
+                self.db.execute('UPDATE entities SET used = ? WHERE key = ?', (now, self._db_key(key)))
+                self.db.commit()
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.entries[key] = (now + self.ttl, value)
+            self.entries.move_to_end(key)
+            self._trim()
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)',
+                                (self._db_key(key), key[0], now + self.ttl, now, json.dumps(value)))
+                self.db.execute('DELETE FROM entities WHERE key IN (SELECT key FROM entities '
+                                'ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+                self.db.commit()
+
+    def _trim(self):
+        # evicts the least recently used in-memory entries beyond maxsize
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        if self.db is not None:
+            self.db.execute('DELETE FROM entities WHERE key = ?', (self._db_key(key),))
+            self.db.commit()
+
+    def invalidate(self, host=None):
+        """
+        Drops every entry for host, or all entries if host is None.
+        """
+        with self.lock:
+            for key in [k for k in self.entries if host is None or k[0] == host]:
+                del self.entries[key]
+            if self.db is not None:
+                if host is None:
+                    self.db.execute('DELETE FROM entities')
+                else:
+                    self.db.execute('DELETE FROM entities WHERE host = ?', (host,))
+                self.db.commit()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+class BlockCache:
+    """
+    Size-bounded LRU cache of converted input blocks, kept as one text
+    file per block under path and named after a digest of the block's
+    content. An entry is a JSON value on one line followed by a text
+    stored verbatim (e.g. serialized entities, which JSON would have to
+    escape). Reading an entry refreshes its modification time; when the
+    cache is closed, the least recently used entries are removed until the
+    directory holds at most max_bytes.
+
+    Entries are written to a temporary file and renamed into place, so
+    several runs can share a cache directory. Entries are only ever
+    parsed as JSON, and eviction only touches files named like an entry.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30, block_size=1 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, key, decode=None):
+        """
+        Returns (value, text) as stored under key, or decode(value, text)
+        if decode is given, or None if there is no entry or it cannot be
+        read or decoded.
+        """
+        name = self._file(key)
+        try:
+            with open(name, 'r', encoding='utf-8', newline='') as f:
+                value = json.loads(f.readline())
+                text = f.read()
+            value = decode(value, text) if decode is not None else (value, text)
+            os.utime(name)
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value, text=''):
+        """
+        Stores value, which must be JSON-serializable, and text under key.
+        """
+        name = self._file(key)
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(name), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                f.write(json.dumps(value, separators=(',', ':')))
+                f.write('\n')
+                f.write(text)
+            os.replace(temporary, name)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache holds at
+        most max_bytes, and returns the number removed. Other files, such
+        as the temporary files of runs still writing, are left alone.
+        """
+        entries = []
+        total = 0
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                if not ENTRY_NAME.match(name):
+                    continue
+                try:
+                    st = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(directory, name)))
+                total += st.st_size
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(name)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def close(self):
+        self.evict()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
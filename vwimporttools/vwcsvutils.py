@@ -0,0 +1,363 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import csv
+import hashlib
+import mmap
+import os
+import re
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+from vwimporttools.vwgraphutils import describe
+from vwimporttools.vwjsonutils import EntityWriter
+
+_strip = str.strip
+
+# a block ends after a line whose CRC-32 has these bits clear (1 line in 512)
+ANCHOR_MASK = 0x1ff
+
+# a line is parsed as CSV when one of its fields starts with a double quote
+QUOTED_FIELD = re.compile(r'(?:^|,)[ \t]*"')
+
+# the most lines a quoted field is joined across before the line is taken
+# as unquoted
+QUOTED_LINE_LIMIT = 64
+
+# bump when the cached block format changes
+BLOCK_FORMAT = 3
+
+
+def _plain_row(line):
+    row = line.split(',')
+    if '"' in line or "'" in line:
+        row = [f.replace('"', '').replace("'", '') for f in row]
+    return row
+
+
+def split_rows(csv_in):
+    """
+    Yields the fields of every line in csv_in, splitting each line exactly
+    once. Lines where a field starts with a double quote go through the csv
+    module, and a quoted field may span up to QUOTED_LINE_LIMIT lines. All
+    other lines, and quoted lines the csv module rejects, take a plain
+    str.split() with double quotes removed from every field. Single quotes
+    are removed from every field.
+    """
+    lines = iter(csv_in)
+    pushed = deque()
+    while True:
+        if pushed:
+            line = pushed.popleft()
+        else:
+            line = next(lines, None)
+            if line is None:
+                return
+        if '"' not in line or not QUOTED_FIELD.search(line):
+            yield _plain_row(line)
+            continue
+        joined = [line]
+        text = line
+        while text.count('"') % 2 and len(joined) < QUOTED_LINE_LIMIT:
+            following = pushed.popleft() if pushed else next(lines, None)
+            if following is None:
+                break
+            if not text.endswith('\n'):
+                text += '\n'
+            text += following
+            joined.append(following)
+        try:
+            if text.count('"') % 2:
+                raise csv.Error('unterminated quoted field')
+            row = next(csv.reader((text,), skipinitialspace=True, strict=True))
+        except csv.Error:
+            # not valid CSV quoting: split the first line the plain way and
+            # read the lines joined to it as rows of their own
+            pushed.extendleft(reversed(joined[1:]))
+            yield _plain_row(line)
+            continue
+        if "'" in text:
+            row = [f.replace("'", '') for f in row]
+        yield row
+
+
+def read_nicknames(csv_in):
+    """
+    Yields (wwn, nickname) for every row of a WWN,nickname CSV file. Rows
+    with fewer than two fields are skipped.
+    """
+    for row in split_rows(csv_in):
+        if len(row) < 2:
+            continue
+        yield row[0].strip(), row[1].strip()
+
+
+def read_relations(csv_in):
+    """
+    Yields (type, name, tags, members) for every row of a
+    Type,Name,Tags,Item1,...,ItemN CSV file. Rows with fewer than three
+    fields are skipped, and empty tags and members are dropped.
+    """
+    for row in split_rows(csv_in):
+        if len(row) < 3:
+            continue
+        tags = row[2]
+        tags = [t for t in map(_strip, tags.split(';')) if t] if tags else []
+        members = [m for m in map(_strip, row[3:]) if m]
+        yield row[0].strip(), row[1].strip(), tags, members
+
+
+def regular_file_path(f):
+    """
+    Returns the path of an open input file if it is a regular file (so it
+    can be split and re-read), or None for stdin and pipes.
+    """
+    name = getattr(f, 'name', None)
+    if isinstance(name, str) and name not in ('-', '<stdin>') and os.path.isfile(name):
+        return name
+    return None
+
+
+def multiline_fields(path, encoding='utf-8'):
+    """
+    Returns True if a line of path opens a quoted field without closing it,
+    i.e. if a quoted field may span lines. Such files cannot be split at
+    newlines (see convert_parallel); only lines with a double quote are
+    looked at.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            pos = mapped.find(b'"')
+            while pos >= 0:
+                start = mapped.rfind(b'\n', 0, pos) + 1
+                end = mapped.find(b'\n', pos)
+                if end < 0:
+                    end = len(mapped)
+                line = str(mapped[start:end], encoding, 'replace')
+                if line.count('"') % 2 and QUOTED_FIELD.search(line):
+                    return True
+                pos = mapped.find(b'"', end)
+    return False
+
+
+def mapped_lines(path, encoding='utf-8', start=0, end=None, block_size=1 << 22):
+    """
+    Yields the lines of path between byte offsets start and end (which must
+    be line-aligned), without their line endings. The file is memory-mapped
+    and decoded one newline-aligned block at a time straight from the
+    mapping, so no read buffers are copied and no per-line decode calls are
+    made.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if end is None or end > size:
+            end = size
+        if start >= end:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                pos = start
+                while pos < end:
+                    stop = end
+                    if pos + block_size < end:
+                        stop = mapped.rfind(b'\n', pos, pos + block_size) + 1 or end
+                    text = str(view[pos:stop], encoding)
+                    pos = stop
+                    if '\r' in text:
+                        text = text.replace('\r\n', '\n').replace('\r', '\n')
+                    lines = text.split('\n')
+                    if not lines[-1]:
+                        lines.pop()
+                    yield from lines
+            finally:
+                view.release()
+
+
+def line_ranges(path, chunk_size):
+    """
+    Splits path into (start, end) byte ranges of roughly chunk_size bytes,
+    each ending just after a newline.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_size, size) - 1)
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def block_ranges(path, block_size):
+    """
+    Splits path into line-aligned (start, end) byte ranges whose boundaries
+    depend on the content around them: a range is at least block_size
+    bytes long and ends after the next anchor line, a line whose CRC-32
+    has the ANCHOR_MASK bits clear (or after 4 * block_size bytes if no
+    anchor turns up), so a range averages block_size bytes plus 512 lines. Inserting or removing lines only moves the
+    boundaries next to the change; the ranges after it hold the same bytes
+    as before.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    if size == 0:
+        return ranges
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        start = 0
+        while start < size:
+            end = size
+            pos = mapped.find(b'\n', min(start + block_size, size) - 1) + 1
+            limit = start + 4 * block_size
+            while pos:
+                newline = mapped.find(b'\n', pos)
+                if newline < 0:
+                    break
+                if newline + 1 >= limit or not zlib.crc32(mapped[pos:newline]) & ANCHOR_MASK:
+                    end = newline + 1
+                    break
+                pos = newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _block_prefix(encoding, convert, args, indent):
+    """
+    Returns a sha256 of everything besides the input bytes that a
+    converted block depends on: the conversion settings and the source of
+    the modules that parse and serialize entities.
+    """
+    prefix = hashlib.sha256(repr((BLOCK_FORMAT, encoding, convert.__qualname__, args, indent)).encode('utf-8'))
+    for name in (convert.__module__, __name__, 'vwimporttools.vwentities', 'vwimporttools.vwjsonutils'):
+        with open(sys.modules[name].__file__, 'rb') as source:
+            prefix.update(source.read())
+    return prefix
+
+
+def _block_key(f, prefix, start, end):
+    f.seek(start)
+    digest = prefix.copy()
+    digest.update(f.read(end - start))
+    return digest.hexdigest()
+
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _convert_range(path, encoding, start, end, convert, args, indent, held, describe):
+    formatter = EntityWriter(None, indent=indent)
+    if held is not None:
+        args = args + (held,)
+    entities = list(convert(mapped_lines(path, encoding, start, end), *args))
+    fragments = [formatter.format(e) for e in entities]
+    descriptions = [describe(e) for e in entities] if describe is not None else None
+    return fragments, descriptions, held
+
+
+def _encode_block(fragments):
+    # serialized entities as a BlockCache value and text: the fragments are
+    # stored verbatim, one after the other, with their lengths
+    return {'lengths': [len(f) for f in fragments]}, ''.join(fragments)
+
+
+def _decode_block(value, text):
+    fragments = []
+    pos = 0
+    for length in value['lengths']:
+        fragments.append(text[pos:pos + length])
+        pos += length
+    if pos != len(text):
+        raise ValueError('fragment lengths do not match the text')
+    return fragments, None, None
+
+
+def convert_parallel(path, encoding, jobs, convert, args, writer, chunk_size=None, held=None, index=None,
+                     cache=None):
+    """
+    Converts the CSV file at path on a pool of jobs processes. The file is
+    split into newline-aligned byte ranges; each worker runs
+    convert(lines, *args), a module-level generator of entities, over its
+    range and returns the serialized entities, which are written to writer
+    in input order. The ranges are cut at newlines, so a file with quoted
+    fields spanning lines (see multiline_fields()) must be converted
+    serially instead.
+
+    If held is given (e.g. an ApplicationIndex), each worker also passes an
+    empty copy of it to convert as a last argument, and the copies filled
+    by the workers are folded back into held with held.update() in input
+    order, for the caller to write once every range is done.
+
+    If index (a DependencyIndex) is given, the serialized entities are
+    added to it, with their types, names and references, instead of being
+    written.
+
+    If cache (a BlockCache) is given, the file is split with block_ranges()
+    into blocks of cache.block_size instead, and the entities of every
+    block are stored in the cache under a digest of its bytes and the
+    conversion settings; blocks found in the cache are not converted again.
+    With jobs=1, blocks are converted in this process. A cache cannot be
+    combined with held or index, whose results span the whole file.
+    """
+    if cache is not None and (held is not None or index is not None):
+        raise ValueError('convert_parallel cannot cache blocks with held or index')
+    if chunk_size is None:
+        if cache is not None:
+            chunk_size = cache.block_size
+        else:
+            chunk_size = max(1 << 20, os.path.getsize(path) // (jobs * 4) + 1)
+    if cache is not None:
+        ranges = block_ranges(path, chunk_size)
+        prefix = _block_prefix(encoding, convert, args, writer.indent)
+    else:
+        ranges = line_ranges(path, chunk_size)
+    if jobs > 1:
+        # loads multiprocessing, which single-process runs do not need
+        from concurrent.futures import ProcessPoolExecutor
+    with (ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext()) as pool, open(path, 'rb') as f:
+        pending = deque()
+
+        def write_next():
+            key, future = pending.popleft()
+            result = future.result()
+            if key is not None:
+                cache.put(key, *_encode_block(result[0]))
+            fragments, descriptions, collected = result
+            if index is not None:
+                for fragment, description in zip(fragments, descriptions):
+                    index.add(fragment, *description)
+            else:
+                writer.write_fragments(fragments)
+            if collected is not None:
+                held.update(collected)
+
+        for start, end in ranges:
+            key = result = None
+            if cache is not None:
+                key = _block_key(f, prefix, start, end)
+                result = cache.get(key, _decode_block)
+            if result is not None:
+                pending.append((None, _completed(result)))
+            else:
+                task = (path, encoding, start, end, convert, args, writer.indent,
+                        type(held)() if held is not None else None, describe if index is not None else None)
+                pending.append((key, pool.submit(_convert_range, *task) if pool is not None
+                                else _completed(_convert_range(*task))))
+            # bound the number of finished-but-unwritten ranges held in memory
+            if len(pending) >= jobs * 2:
+                write_next()
+        while pending:
+            write_next()
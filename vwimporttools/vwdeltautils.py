@@ -0,0 +1,181 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+from vwimporttools.vwentities import parse_itl
+
+# Entity types whose import entities are aliases (new_name + wwn) and are
+# matched against the appliance by WWN rather than by name.
+ALIAS_TYPES = ('hostport', 'storageport')
+
+# Property ids, as returned by VWtokenutils.get_entities, that may hold the
+# current members of an edit structure in the import format. If none of
+# them is present, the members are unknown and not compared.
+MEMBER_PROPERTIES = {
+    'child_entities': ('child_entities', 'children', 'members'),
+    'devices': ('devices', 'children', 'members'),
+    'itl_patterns': ('itl_patterns', 'itlPatterns'),
+}
+
+
+def normalize_wwn(wwn):
+    return str(wwn).lower().replace(':', '').replace('-', '')
+
+
+def _as_set(value):
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        return {v.strip() for v in value.replace(',', ';').split(';') if v.strip()}
+    if isinstance(value, dict):
+        # an edit structure, as in the import format
+        return _as_set(value.get('add'))
+    return {str(v.get('name', '')) if isinstance(v, dict) else str(v) for v in value}
+
+
+def _itl(pattern):
+    # one pattern as an (initiator, target, lun) tuple, or None
+    if isinstance(pattern, dict):
+        if pattern.get('edit_type', 'add') != 'add' or 'initiator' not in pattern or 'target' not in pattern:
+            return None
+        lun = pattern.get('lun')
+        return str(pattern['initiator']), str(pattern['target']), None if lun is None else str(lun)
+    if isinstance(pattern, str):
+        return parse_itl(pattern.strip())
+    if isinstance(pattern, (list, tuple)) and len(pattern) in (2, 3):
+        lun = pattern[2] if len(pattern) == 3 else None
+        return str(pattern[0]), str(pattern[1]), None if lun is None else str(lun)
+    return None
+
+
+def normalize_itl(value):
+    """
+    Returns the ITL patterns in value as a set of (initiator, target, lun)
+    tuples, lun None for I:T patterns. value may be the import format's
+    list of {"edit_type": "add", ...} dicts, or a list of pattern dicts,
+    (initiator, target[, lun]) sequences or I:T[:L] strings as the
+    appliance may return them.
+    """
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        value = [v for v in value.replace(',', ';').split(';') if v.strip()]
+    patterns = set()
+    for pattern in value:
+        pattern = _itl(pattern)
+        if pattern is not None:
+            patterns.add(pattern)
+    return patterns
+
+
+def _itl_edit(pattern, edit_type):
+    initiator, target, lun = pattern
+    edit = {'edit_type': edit_type, 'initiator': initiator, 'target': target}
+    if lun is not None:
+        edit['lun'] = lun
+    return edit
+
+
+def entity_key(entity):
+    etype = str(entity.get('type', '')).lower()
+    if etype in ALIAS_TYPES and 'wwn' in entity:
+        return etype, normalize_wwn(entity['wwn'])
+    return etype, entity.get('name')
+
+
+def index_current(kind, entities):
+    """
+    Indexes get_entities(kind) results by the same key entity_key() gives
+    the import entities of that kind.
+    """
+    kind = kind.lower()
+    if kind in ALIAS_TYPES:
+        return {(kind, normalize_wwn(e['wwn'])): e for e in entities if e.get('wwn')}
+    return {(kind, e.get('name')): e for e in entities}
+
+
+def diff_entity(entity, current, prune=False, unknown=None):
+    """
+    Returns the import entity needed to turn current (a get_entities
+    property dict, or None if the entity does not exist) into entity, or
+    None if nothing changed. Edit structures and ITL patterns only add
+    missing members unless prune is set, in which case members the input
+    does not list are removed.
+
+    Fields for which current has no property (see MEMBER_PROPERTIES) are
+    unknown rather than changed: they are left out of the result, and
+    their names are added to unknown if it is given (a set).
+    """
+    if current is None:
+        return entity
+    if 'new_name' in entity:
+        return None if current.get('name') == entity['new_name'] else entity
+
+    delta = {'name': entity.get('name'), 'type': entity.get('type')}
+    for field, value in entity.items():
+        if field in ('name', 'type'):
+            continue
+        if field in MEMBER_PROPERTIES:
+            prop = next((p for p in MEMBER_PROPERTIES[field] if p in current), None)
+            if prop is None:
+                if unknown is not None:
+                    unknown.add(field)
+                continue
+            if field == 'itl_patterns':
+                have = normalize_itl(current[prop])
+                wanted = [p for p in map(_itl, value) if p is not None]
+                edit = [_itl_edit(p, 'add') for p in dict.fromkeys(wanted) if p not in have]
+                if prune:
+                    edit.extend(_itl_edit(p, 'remove') for p in sorted(have - set(wanted), key=repr))
+            else:
+                have = _as_set(current[prop])
+                want = _as_set(value.get('add', []))
+                edit = {}
+                if want - have:
+                    edit['add'] = [m for m in value.get('add', []) if m not in have]
+                if prune and have - want:
+                    edit['remove'] = sorted(have - want)
+            if edit:
+                delta[field] = edit
+        elif field not in current:
+            if unknown is not None:
+                unknown.add(field)
+        elif field == 'tags':
+            if _as_set(value) != _as_set(current['tags']):
+                delta[field] = value
+        elif current[field] != value:
+            delta[field] = value
+
+    return delta if len(delta) > 2 else None
+
+
+def compute_delta(vw, entities, prune=False, unknown=None):
+    """
+    Diffs entities (any iterable, consumed once) against the appliance,
+    fetching the current entities of each type the first time it is seen.
+    Returns (True, changed entities) in input order, or (False, error) if
+    the current state could not be read. If unknown is given (a list), the
+    (type, name) keys of existing entities with fields that could not be
+    compared are appended to it.
+    """
+    current = {}
+    fetched = set()
+    changes = []
+    for entity in entities:
+        kind = str(entity.get('type', '')).lower()
+        if kind not in fetched:
+            rc, res = vw.get_entities(kind)
+            if not rc:
+                return False, res
+            current.update(index_current(kind, res))
+            fetched.add(kind)
+        fields = set() if unknown is not None else None
+        key = entity_key(entity)
+        delta = diff_entity(entity, current.get(key), prune, fields)
+        if fields:
+            unknown.append(key)
+        if delta is not None:
+            changes.append(delta)
+    return True, changes
@@ -0,0 +1,231 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import sys
+
+_intern = sys.intern
+
+
+def parse_itl(member):
+    """
+    Parses an I:T or I:T:L member with a single split, returning
+    (initiator, target, lun) with interned initiator and target and lun None
+    for I:T, or None if member is a device rather than an ITL pattern.
+    """
+    parts = member.split(':')
+    if len(parts) == 3:
+        return _intern(parts[0]), _intern(parts[1]), parts[2]
+    if len(parts) == 2:
+        return _intern(parts[0]), _intern(parts[1]), None
+    return None
+
+
+class BaseEntity:
+    """
+    Base of the import entity types. Entities use __slots__ rather than a
+    per-instance __dict__, and to_dict() returns exactly the structure the
+    import format expects.
+    """
+    __slots__ = ()
+
+    def names(self):
+        """
+        Returns the names other entities may use to refer to this one.
+        """
+        return (self.name,)
+
+    def references(self):
+        """
+        Returns the names of the entities this one refers to.
+        """
+        return ()
+
+    def to_dict(self):
+        """
+        Returns the entity's slots, base class slots first, as a dict.
+        Subclasses whose import structure differs from their slots override
+        this.
+        """
+        return {name: getattr(self, name) for cls in reversed(type(self).__mro__)
+                for name in getattr(cls, '__slots__', ())}
+
+
+class AliasEntity(BaseEntity):
+    """
+    A WWN to nickname mapping for a port.
+    """
+    __slots__ = ('new_name', 'wwn', 'type')
+
+    def __init__(self, name, wwn, etype):
+        self.new_name = name
+        self.wwn = wwn
+        self.type = etype
+
+    def names(self):
+        return self.new_name, self.wwn
+
+    def to_dict(self):
+        # same as BaseEntity.to_dict(), spelled out: aliases are written by
+        # the million and the generic version is several times slower
+        return {'new_name': self.new_name, 'wwn': self.wwn, 'type': self.type}
+
+
+class HostPort(AliasEntity):
+    __slots__ = ()
+
+
+class StoragePort(AliasEntity):
+    __slots__ = ()
+
+
+class RelationEntity(BaseEntity):
+    """
+    An entity defined by its child entities, e.g. an hba and its ports or a
+    host and its hbas.
+    """
+    __slots__ = ('name', 'type', 'tags', 'children')
+
+    def __init__(self, name, etype, tags, child_entities):
+        self.name = name
+        self.type = etype
+        self.tags = tags
+        self.children = child_entities
+
+    def references(self):
+        return self.children
+
+    def to_dict(self):
+        return {'name': self.name, 'type': self.type, 'tags': self.tags, 'child_entities': {'add': self.children}}
+
+
+class Hba(RelationEntity):
+    __slots__ = ()
+
+
+class Host(RelationEntity):
+    __slots__ = ()
+
+
+class ApplicationEntity(BaseEntity):
+    """
+    An application, defined by initiator:target[:lun] (ITL) patterns and
+    by devices (any member that is not an I:T or I:T:L pattern). ITL
+    patterns are kept as (initiator, target, lun) tuples, with lun None for
+    I:T patterns, in insertion-ordered dicts that double as a deduplication
+    index; duplicates counts the patterns and devices that were dropped.
+    """
+    __slots__ = ('name', 'type', 'tags', 'itl_patterns', 'devices', 'duplicates')
+
+    def __init__(self, name, etype, tags, initiator_list):
+        self.name = name
+        self.type = etype
+        self.tags = tags
+        self.itl_patterns = {}
+        self.devices = {}
+        self.duplicates = 0
+        self.add_members(initiator_list)
+
+    def add_members(self, members):
+        """
+        Adds members, skipping any pattern or device already present, and
+        returns the number of duplicates skipped.
+        """
+        patterns = self.itl_patterns
+        devices = self.devices
+        before = len(patterns) + len(devices)
+        count = 0
+        for member in members:
+            count += 1
+            pattern = parse_itl(member)
+            if pattern is None:
+                devices[member] = None
+            else:
+                patterns[pattern] = None
+        dropped = count - (len(patterns) + len(devices) - before)
+        self.duplicates += dropped
+        return dropped
+
+    def merge(self, other):
+        """
+        Folds another definition of the same application (e.g. from a later
+        CSV row) into this one.
+        """
+        self.tags = self.tags + [t for t in other.tags if t not in self.tags]
+        before = len(self.itl_patterns) + len(self.devices)
+        self.itl_patterns.update(other.itl_patterns)
+        self.devices.update(other.devices)
+        added = len(self.itl_patterns) + len(self.devices) - before
+        self.duplicates += other.duplicates + len(other.itl_patterns) + len(other.devices) - added
+
+    def references(self):
+        return self.devices
+
+    def to_dict(self):
+        entity = {'name': self.name, 'type': self.type, 'tags': self.tags}
+        if self.itl_patterns:
+            entity['itl_patterns'] = [
+                {'edit_type': 'add', 'initiator': i, 'target': t} if l is None else
+                {'edit_type': 'add', 'initiator': i, 'target': t, 'lun': l}
+                for i, t, l in self.itl_patterns
+            ]
+        if self.devices:
+            entity['devices'] = {'add': list(self.devices)}
+        return entity
+
+
+class ApplicationIndex:
+    """
+    Collects application entities by name, merging applications that are
+    defined on several rows into the first definition. Iterating yields the
+    merged applications in order of first appearance.
+    """
+
+    def __init__(self):
+        self.applications = {}
+        self.merged = 0
+
+    def add(self, entity):
+        existing = self.applications.get(entity.name)
+        if existing is None:
+            self.applications[entity.name] = entity
+        else:
+            existing.merge(entity)
+            self.merged += 1
+
+    def update(self, other):
+        for entity in other:
+            self.add(entity)
+        self.merged += other.merged
+
+    @property
+    def duplicates(self):
+        return sum(e.duplicates for e in self.applications.values())
+
+    def __iter__(self):
+        return iter(self.applications.values())
+
+    def __len__(self):
+        return len(self.applications)
+
+
+ALIAS_TYPES = {
+    'hostport': HostPort,
+    'storageport': StoragePort,
+}
+
+RELATION_TYPES = {
+    'hba': Hba,
+    'host': Host,
+    'application': ApplicationEntity,
+}
+
+
+def alias_entity(name, wwn, etype):
+    return ALIAS_TYPES.get(etype.lower(), AliasEntity)(name, wwn, etype)
+
+
+def relation_entity(etype, name, tags, members):
+    return RELATION_TYPES.get(etype.lower(), RelationEntity)(name, etype, tags, members)
@@ -0,0 +1,252 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import csv
+import json
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from vwimporttools.vwjsonutils import COMPACT_SEPARATORS
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'parquet')
+
+FORMAT_EXTENSIONS = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'ndjson', '.csv': 'csv',
+                     '.parquet': 'parquet'}
+
+TABLE_STATISTICS = ('avg', 'min', 'max', 'median', '5th', '25th', '75th', '95th')
+
+# the columns written for each chart type; times are epoch milliseconds
+REPORT_FIELDS = {
+    'topxtrend': ('entityType', 'entity', 'timestamp', 'metric', 'value'),
+    'topxcard': ('entityType', 'entity', 'windowStart', 'windowEnd', 'metric', 'value'),
+    'topxtable': ('entityType', 'entity', 'windowStart', 'windowEnd', 'metric') + TABLE_STATISTICS,
+    'histogram': ('entityType', 'windowStart', 'windowEnd', 'metric', 'bucket', 'value'),
+}
+
+FIELD_TYPES = {'timestamp': 'int64', 'windowStart': 'int64', 'windowEnd': 'int64', 'value': 'float64'}
+FIELD_TYPES.update((k, 'float64') for k in TABLE_STATISTICS)
+
+WINDOW_UNITS = {'s': 1000, 'm': 60000, 'h': 3600000, 'd': 86400000}
+WINDOW_PATTERN = re.compile(r'^\s*(\d+)\s*([smhd]?)\s*$')
+
+
+def parse_window(value):
+    """
+    Returns the length in milliseconds of a window given as a number of
+    seconds or with a unit: 30s, 15m, 1h, 1d.
+    """
+    match = WINDOW_PATTERN.match(str(value).lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError('invalid window {!r}; use e.g. 900, 15m, 1h or 1d'.format(value))
+    return int(match.group(1)) * WINDOW_UNITS[match.group(2) or 's']
+
+
+def parse_time(value):
+    """
+    Returns epoch milliseconds for a time given as epoch milliseconds or in
+    ISO 8601 form (2021-11-15 or 2021-11-15T08:00:00; UTC unless an offset
+    is given).
+    """
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('invalid time {!r}; use epoch milliseconds or ISO 8601'.format(value))
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp() * 1000)
+
+
+def time_windows(start, end, window):
+    """
+    Yields consecutive half-open (start, end) windows of at most window
+    milliseconds covering [start, end).
+    """
+    while start < end:
+        yield start, min(start + window, end)
+        start += window
+
+
+def export_format(path, fmt=None):
+    """
+    Returns fmt, or the format implied by the extension of path.
+    """
+    if fmt:
+        return fmt
+    for extension, name in FORMAT_EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return name
+    return 'ndjson'
+
+
+def report_rows(chart_type, result_data, metric, entity_type, window):
+    """
+    Yields one flat dict per row of a report result for the columns in
+    REPORT_FIELDS[chart_type]. Trend samples outside the half-open window
+    are dropped, so a sample on a boundary is written once even if the
+    appliance returns it for both windows.
+    """
+    start, end = window
+    if chart_type == 'topxtrend':
+        for result in result_data:
+            entity = result['entityName']
+            for timestamp, value in result['data']:
+                if start <= timestamp < end:
+                    yield {'entityType': entity_type, 'entity': entity, 'timestamp': timestamp, 'metric': metric,
+                           'value': value}
+    elif chart_type == 'topxcard':
+        for result in result_data:
+            yield {'entityType': entity_type, 'entity': result['entityName'], 'windowStart': start,
+                   'windowEnd': end, 'metric': metric, 'value': result['entityValue']}
+    elif chart_type == 'topxtable':
+        for result in result_data:
+            row = {'entityType': entity_type, 'entity': result['entityName'], 'windowStart': start,
+                   'windowEnd': end, 'metric': metric}
+            row.update((k, result.get(k)) for k in TABLE_STATISTICS)
+            yield row
+    elif chart_type == 'histogram':
+        buckets = result_data.items() if isinstance(result_data, dict) else enumerate(result_data)
+        for bucket, value in buckets:
+            if isinstance(value, (list, tuple)) and len(value) == 2:
+                bucket, value = value
+            yield {'entityType': entity_type, 'windowStart': start, 'windowEnd': end, 'metric': metric,
+                   'bucket': str(bucket), 'value': value}
+    else:
+        raise ValueError('cannot export chart type {!r}'.format(chart_type))
+
+
+class NDJSONWriter:
+    def __init__(self, f, fields):
+        self.f = f
+
+    def write(self, rows):
+        count = 0
+        for row in rows:
+            self.f.write(json.dumps(row, separators=COMPACT_SEPARATORS))
+            self.f.write('\n')
+            count += 1
+        self.f.flush()
+        return count
+
+    def close(self):
+        pass
+
+
+class CSVWriter:
+    def __init__(self, f, fields):
+        self.f = f
+        self.writer = csv.DictWriter(f, fields, lineterminator='\n')
+        self.writer.writeheader()
+
+    def write(self, rows):
+        count = 0
+        for row in rows:
+            self.writer.writerow(row)
+            count += 1
+        self.f.flush()
+        return count
+
+    def close(self):
+        pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+class ParquetWriter:
+    """
+    Writes every window as one Parquet row group; needs pyarrow.
+    """
+
+    def __init__(self, path, fields):
+        pa = _pyarrow()
+        if pa is None:
+            raise ValueError('Parquet output needs pyarrow (pip install pyarrow)')
+        self.pa = pa
+        self.fields = fields
+        self.schema = pa.schema([(k, getattr(pa, FIELD_TYPES.get(k, 'string'))()) for k in fields])
+        self.writer = pa.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = {k: [] for k in self.fields}
+        for row in rows:
+            for k in self.fields:
+                columns[k].append(row.get(k))
+        count = len(columns[self.fields[0]])
+        if count:
+            self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+        return count
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(fmt, output, chart_type):
+    """
+    Returns a writer with write(rows) and close() for fmt. output is a text
+    file for ndjson and csv and a path for parquet.
+    """
+    fields = REPORT_FIELDS.get(chart_type)
+    if fields is None:
+        raise ValueError('cannot export chart type {!r}'.format(chart_type))
+    if fmt == 'parquet':
+        return ParquetWriter(output, fields)
+    return (CSVWriter if fmt == 'csv' else NDJSONWriter)(output, fields)
+
+
+def export_report(vw, payload, windows, writer, start_field='startTime', end_field='endTime', parallel=1,
+                  progress=None):
+    """
+    Runs payload once per (start, end) window, with the window set in
+    start_field and end_field, and writes the rows of every window to
+    writer in window order as soon as it is complete. At most parallel
+    windows are requested (and held in memory) at a time. progress, if
+    given, is called with (window, rows) after each window is written.
+
+    Returns (True, {'windows': ..., 'rows': ...}) or (False, error).
+    """
+    chart_type, metric, entity_type = payload['chartType'], payload.get('metricName'), payload.get('entityType')
+    summary = {'windows': 0, 'rows': 0}
+    pending = deque()
+    windows = iter(windows)
+
+    def submit(executor):
+        for window in windows:
+            request = dict(payload)
+            request[start_field], request[end_field] = window
+            pending.append((window, executor.submit(vw.get_report, request)))
+            return
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        for _ in range(parallel):
+            submit(executor)
+        while pending:
+            window, future = pending.popleft()
+            rc, res = future.result()
+            if not rc:
+                for _, f in pending:
+                    f.cancel()
+                return False, 'Window {}-{} failed: {}'.format(window[0], window[1], res)
+            submit(executor)
+            charts = res.get('charts') if isinstance(res, dict) else None
+            result_data = charts[0]['chartData'] if charts else []
+            rows = writer.write(report_rows(chart_type, result_data, metric, entity_type, window))
+            # drop this window before waiting for the next one
+            res = result_data = None
+            summary['windows'] += 1
+            summary['rows'] += rows
+            if progress is not None:
+                progress(window, rows)
+    return True, summary
@@ -0,0 +1,198 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+# Entity types in dependency order: an entity can only be imported once the
+# entities it refers to exist, so ports come before hbas, hbas before hosts
+# and hosts before applications. Unknown types go last.
+IMPORT_RANK = {
+    'hostport': 0,
+    'storageport': 0,
+    'hba': 1,
+    'iomodule': 1,
+    'host': 2,
+    'storagecontroller': 2,
+    'application': 3,
+    'storagearray': 3,
+}
+
+# Entity types whose members are ports. Ports are usually discovered by the
+# appliance (or imported from a separate nicknames file) rather than defined
+# alongside them, so unknown references from these types are not reported.
+PORT_PARENTS = ('hba', 'iomodule')
+
+
+def rank(etype):
+    return IMPORT_RANK.get(str(etype).lower(), len(IMPORT_RANK))
+
+
+def describe(entity):
+    """
+    Returns (type, names, references) for an import entity, given either as
+    a dict in the import format or as a vwentities object.
+    """
+    if not isinstance(entity, dict):
+        return entity.type, entity.names(), entity.references()
+    etype = str(entity.get('type', ''))
+    if 'new_name' in entity:
+        return etype, (entity['new_name'], entity.get('wwn')), ()
+    references = []
+    for field in ('child_entities', 'devices'):
+        value = entity.get(field)
+        if isinstance(value, dict):
+            references.extend(value.get('add', []))
+    return etype, (entity.get('name'),), references
+
+
+class DependencyIndex:
+    """
+    Index of the entities of one import, by type and name, and of the
+    references between them. Items can be anything (entity objects,
+    serialized fragments, positions in an EntityDocument); each is added
+    with its type, names and references.
+
+    resolve() looks every reference up once, reports references to entities
+    that are not in the index and reference cycles, and gives every item a
+    level: its IMPORT_RANK, raised above the level of anything it refers to.
+    Items of one level only depend on items of lower levels, so ordered()
+    is a topological order (ports, hbas, hosts, applications) and levels()
+    gives tiers that can be imported one after the other.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.types = []
+        self.names = []
+        self.references = []
+        self.by_type = {}
+        self.by_name = {}
+        self.shared = {}
+        self.unknown = []
+        self.cycles = []
+        self._levels = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item, etype, names, references):
+        position = len(self.items)
+        etype = str(etype).lower()
+        self.items.append(item)
+        self.types.append(etype)
+        self.names.append(names[0] if names[0] is not None else '')
+        self.references.append(references)
+        index = self.by_type.get(etype)
+        if index is None:
+            index = self.by_type[etype] = {}
+        by_name = self.by_name
+        for name in names:
+            if name is None or name in index:
+                continue
+            index[name] = position
+            first = by_name.setdefault(name, position)
+            if first != position:
+                # the same name is used by entities of different types
+                self.shared.setdefault(name, [first]).append(position)
+        self._levels = None
+
+    def add_entity(self, entity):
+        self.add(entity, *describe(entity))
+
+    def get(self, etype, name):
+        """
+        Returns the item defining the etype entity called name, or None.
+        """
+        position = self.by_type.get(str(etype).lower(), {}).get(name)
+        return None if position is None else self.items[position]
+
+    def _choose(self, position, candidates, ranks):
+        # a name defined by several types refers to the nearest lower-ranked
+        # one, or else to any entity other than the referring one
+        own = ranks[position]
+        lower = [p for p in candidates if ranks[p] < own]
+        if lower:
+            return max(lower, key=ranks.__getitem__)
+        return next((p for p in candidates if p != position), position)
+
+    def resolve(self):
+        """
+        Resolves every reference and computes the level of every item.
+        Returns (unknown, cycles): a list of (name, reference) pairs for
+        references to entities that are not in the index (except from
+        PORT_PARENTS), and a list of cycles, each a list of names.
+        """
+        count = len(self.items)
+        type_ranks = {t: rank(t) for t in self.by_type}
+        ranks = [type_ranks[t] for t in self.types]
+        by_name = self.by_name
+        shared = self.shared
+        unknown = self.unknown = []
+        children = []
+        for position in range(count):
+            resolved = []
+            report = self.types[position] not in PORT_PARENTS
+            for reference in self.references[position]:
+                child = by_name.get(reference)
+                if child is None:
+                    if report:
+                        unknown.append((self.names[position], reference))
+                    continue
+                if reference in shared:
+                    child = self._choose(position, shared[reference], ranks)
+                resolved.append(child)
+            children.append(resolved)
+
+        # iterative depth-first search; a child met while still on the
+        # stack closes a cycle
+        levels = [-1] * count
+        state = [0] * count
+        on_stack = {}
+        self.cycles = []
+        for start in range(count):
+            if state[start]:
+                continue
+            stack = [(start, iter(children[start]))]
+            state[start] = 1
+            on_stack[start] = 0
+            while stack:
+                node, pending = stack[-1]
+                for child in pending:
+                    if state[child] == 0:
+                        state[child] = 1
+                        on_stack[child] = len(stack)
+                        stack.append((child, iter(children[child])))
+                        break
+                    if state[child] == 1:
+                        cycle = [self.names[n] for n, _ in stack[on_stack[child]:]]
+                        self.cycles.append(cycle + [self.names[child]])
+                else:
+                    stack.pop()
+                    del on_stack[node]
+                    state[node] = 2
+                    level = ranks[node]
+                    for child in children[node]:
+                        if levels[child] >= level:
+                            level = levels[child] + 1
+                    levels[node] = level
+        self._levels = levels
+        return self.unknown, self.cycles
+
+    def levels(self):
+        """
+        Returns the items grouped by level, lowest first, each group in the
+        order the items were added.
+        """
+        if self._levels is None:
+            self.resolve()
+        groups = {}
+        for item, level in zip(self.items, self._levels):
+            groups.setdefault(level, []).append(item)
+        return [groups[level] for level in sorted(groups)]
+
+    def ordered(self):
+        """
+        Returns the items in dependency order.
+        """
+        return [item for group in self.levels() for item in group]
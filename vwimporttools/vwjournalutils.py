@@ -0,0 +1,97 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import json
+import os
+import threading
+import time
+from vwimporttools.vwjsonutils import COMPACT_SEPARATORS
+
+
+class ImportJournal:
+    """
+    Append-only record of the progress of an import, one JSON object per
+    line:
+
+        {"time": ..., "host": "10.20.30.40", "batch": <digest>, "stage": "start", "transactionId": 42, "count": 5000}
+
+    batch is the EntityDocument.digest() of the chunk, host the appliance it
+    is imported into (one journal can cover several), and stage is the last
+    step that succeeded: start (uploaded and verified), commit (commit
+    accepted), done (import finished) or failed. Every record is written
+    with a single append and fsynced before the import moves on, so a crash
+    can at worst leave a torn last line, which is skipped when the journal
+    is read back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.batches = {}
+        created = not os.path.exists(path)
+        torn = self._load()
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if torn:
+            # terminate the torn record so the next one starts on its own line
+            os.write(self.fd, b'\n')
+            os.fsync(self.fd)
+        if created:
+            self._sync_directory()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'batch' in record:
+                self.batches[(record.get('host'), record['batch'])] = record
+        return bool(data) and not data.endswith(b'\n')
+
+    def _sync_directory(self):
+        # make the new directory entry durable too (not possible on Windows)
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def last(self, batch, host=None):
+        """
+        Returns the latest record for batch on host, or None.
+        """
+        return self.batches.get((host, batch))
+
+    def record(self, batch, stage, transactionId=None, host=None, **fields):
+        record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'host': host, 'batch': batch, 'stage': stage,
+                  'transactionId': transactionId}
+        record.update(fields)
+        line = (json.dumps(record, separators=COMPACT_SEPARATORS) + '\n').encode('utf-8')
+        with self.lock:
+            os.write(self.fd, line)
+            os.fsync(self.fd)
+            self.batches[(host, batch)] = record
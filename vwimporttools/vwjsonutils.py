@@ -0,0 +1,372 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import hashlib
+import json
+import re
+
+COMPACT_SEPARATORS = (',', ':')
+
+# the separator after an array element, and the whitespace around it
+_ELEMENT_SEPARATOR = re.compile(r'[ \t\r\n]*([,\]])[ \t\r\n]*')
+
+
+def _default(o):
+    # entities with __slots__ provide to_dict(); other objects use __dict__
+    to_dict = getattr(o, 'to_dict', None)
+    return to_dict() if to_dict is not None else o.__dict__
+
+
+# json.dumps() builds a new encoder on every call with non-default
+# arguments; the hot paths reuse these instead.
+_compact_encode = json.JSONEncoder(separators=COMPACT_SEPARATORS, default=_default).encode
+_pretty_encode = json.JSONEncoder(indent=2, default=_default).encode
+
+
+def dumps(obj, pretty=False):
+    """
+    Serializes obj for the wire: compact (no whitespace, keys in insertion
+    order) by default, or indented by two spaces when pretty is set.
+    """
+    if pretty:
+        return _pretty_encode(obj)
+    return _compact_encode(obj)
+
+
+class EntityWriter:
+    """
+    Writes a VW entity import document ({"version": 2, "entities": [...]})
+    to a file one entity at a time, so the document never has to be held in
+    memory. The output is identical to json.dumps() of the whole document
+    with the same indent; indent=None writes the compact wire format. Any
+    other top-level members, given as a dict in extra, are written after
+    the version.
+    """
+
+    def __init__(self, out, version=2, indent=2, extra=None):
+        self.out = out
+        self.version = version
+        self.indent = indent
+        self.extra = extra or {}
+        self.count = 0
+        self.encode = _compact_encode if indent is None else json.JSONEncoder(indent=indent, default=_default).encode
+        if indent is None:
+            self.first_sep = ''
+            self.item_sep = ','
+            self.item_end = ''
+        else:
+            self.first_sep = '\n' + ' ' * (indent * 2)
+            self.item_sep = ',' + self.first_sep
+            self.item_end = '\n' + ' ' * indent
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def open(self):
+        if self.indent is None:
+            members = ['"version":' + json.dumps(self.version)]
+            members.extend(json.dumps(k) + ':' + self.encode(v) for k, v in self.extra.items())
+            self.out.write('{' + ','.join(members) + ',"entities":[')
+        else:
+            pad = ' ' * self.indent
+            members = ['"version": ' + json.dumps(self.version)]
+            members.extend(json.dumps(k) + ': ' + self.encode(v).replace('\n', '\n' + pad)
+                           for k, v in self.extra.items())
+            self.out.write('{\n' + pad + (',\n' + pad).join(members) + ',\n' + pad + '"entities": [')
+
+    def format(self, entity):
+        """
+        Serializes entity as it appears inside the entities array, so that
+        it can be produced elsewhere (e.g. in a worker process) and written
+        later with write_fragment().
+        """
+        if hasattr(entity, 'to_dict'):
+            entity = entity.to_dict()
+        if self.indent is None:
+            return self.encode(entity)
+        return self.encode(entity).replace('\n', '\n' + ' ' * (self.indent * 2))
+
+    def write(self, entity):
+        self.write_fragment(self.format(entity))
+
+    def write_fragment(self, fragment):
+        """
+        Writes an entity already serialized by format() (or, in compact
+        mode, by dumps()).
+        """
+        self.out.write((self.item_sep if self.count else self.first_sep) + fragment)
+        self.count += 1
+
+    def write_fragments(self, fragments):
+        """
+        Writes a list of serialized entities with a single write.
+        """
+        if fragments:
+            self.out.write((self.item_sep if self.count else self.first_sep) + self.item_sep.join(fragments))
+            self.count += len(fragments)
+
+    def close(self):
+        if self.indent is None:
+            self.out.write(']}')
+        else:
+            self.out.write((self.item_end if self.count else '') + ']\n}')
+
+
+def read_document(fp, chunk_size=1 << 16, with_text=False):
+    """
+    Parses the JSON object in fp incrementally, reading chunk_size characters
+    at a time. Yields (key, value) for every top-level member, except that
+    the elements of the top-level "entities" array are yielded one at a time
+    as ('entities', entity). With with_text, (key, value, text) is yielded
+    instead, text being the value's JSON as it appears in fp. Only one
+    entity (plus one read chunk) is held in memory at a time. Raises
+    ValueError on malformed input, including anything but whitespace after
+    the object.
+    """
+    raw_decode = json.JSONDecoder().raw_decode
+    state = {'buf': '', 'pos': 0, 'start': 0, 'offset': 0, 'eof': False}
+
+    def fill(size=chunk_size):
+        if state['eof']:
+            return False
+        data = fp.read(size)
+        if not data:
+            state['eof'] = True
+            return False
+        if state['pos'] > chunk_size:
+            state['buf'] = state['buf'][state['pos']:]
+            state['offset'] += state['pos']
+            state['pos'] = 0
+        state['buf'] += data
+        return True
+
+    def peek(eof_ok=False):
+        while True:
+            buf, pos = state['buf'], state['pos']
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                if eof_ok:
+                    return None
+                raise ValueError('Unexpected end of JSON input')
+
+    def expect(chars):
+        c = peek()
+        if c not in chars:
+            raise ValueError('Expecting {} at character {}'.format(' or '.join(repr(x) for x in chars), state['offset'] + state['pos']))
+        state['pos'] += 1
+        return c
+
+    def value():
+        peek()
+        while True:
+            # a value cut off by the end of the buffer is decoded again from
+            # its start, so the unparsed part of the buffer grows fourfold
+            # each time to keep the work linear in the size of the value
+            more = max(chunk_size, 3 * (len(state['buf']) - state['pos']))
+            try:
+                obj, end = raw_decode(state['buf'], state['pos'])
+            except json.JSONDecodeError as e:
+                if fill(more):
+                    continue
+                raise ValueError('{} at character {}'.format(e.msg, state['offset'] + e.pos))
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(state['buf']) and fill(more):
+                continue
+            state['start'], state['pos'] = state['pos'], end
+            return obj
+
+    def member(key):
+        obj = value()
+        if with_text:
+            return key, obj, state['buf'][state['start']:state['pos']]
+        return key, obj
+
+    def finish():
+        if peek(eof_ok=True) is not None:
+            raise ValueError('Extra data at character {}'.format(state['offset'] + state['pos']))
+
+    expect('{')
+    if peek() == '}':
+        expect('}')
+        finish()
+        return
+    while True:
+        key = value()
+        if not isinstance(key, str):
+            raise ValueError('Expecting property name at character {}'.format(state['offset'] + state['pos']))
+        expect(':')
+        if key == 'entities' and peek() == '[':
+            expect('[')
+            if peek() == ']':
+                expect(']')
+            else:
+                yield member(key)
+                while True:
+                    # fast path for elements that lie wholly in the buffer
+                    buf = state['buf']
+                    m = _ELEMENT_SEPARATOR.match(buf, state['pos'])
+                    if m is not None and m.end() < len(buf):
+                        if m.group(1) == ']':
+                            state['pos'] = m.end()
+                            break
+                        try:
+                            obj, end = raw_decode(buf, m.end())
+                        except json.JSONDecodeError:
+                            obj = end = None
+                        if end is not None and end < len(buf):
+                            state['pos'] = end
+                            yield (key, obj, buf[m.end():end]) if with_text else (key, obj)
+                            continue
+                    if expect(',]') == ']':
+                        break
+                    yield member(key)
+        else:
+            yield member(key)
+        if expect(',}') == '}':
+            finish()
+            return
+
+
+class EntityDocument:
+    """
+    An import document whose entities are held as compact JSON fragments
+    rather than as Python objects. body() streams the document for upload
+    without building it as one string. Top-level members other than version
+    and entities are kept in the dict extra and uploaded as they are.
+    """
+
+    def __init__(self, version=2, extra=None):
+        self.version = version
+        self.extra = dict(extra or {})
+        self.types = []
+        self.fragments = []
+        self._rendered = {}
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def append(self, entity):
+        self.types.append(str(entity.get('type', '')).lower())
+        self.fragments.append(dumps(entity))
+
+    def append_fragment(self, fragment, etype=None):
+        """
+        Appends an entity already serialized on one line (e.g. in compact
+        form); its type is read from the fragment unless given.
+        """
+        if etype is None:
+            etype = json.loads(fragment).get('type', '')
+        self.types.append(str(etype).lower())
+        self.fragments.append(fragment)
+
+    def entities(self):
+        return (json.loads(f) for f in self.fragments)
+
+    def subset(self, indices):
+        document = EntityDocument(self.version, self.extra)
+        document.types = [self.types[i] for i in indices]
+        document.fragments = [self.fragments[i] for i in indices]
+        return document
+
+    def digest(self):
+        """
+        Returns a SHA-256 hex digest of the version, any extra members and
+        the entities, which identifies the document across runs.
+        """
+        h = hashlib.sha256(str(self.version).encode('utf-8'))
+        if self.extra:
+            h.update(b'\n')
+            h.update(dumps(self.extra).encode('utf-8'))
+        for fragment in self.fragments:
+            h.update(b'\n')
+            h.update(fragment.encode('utf-8'))
+        return h.hexdigest()
+
+    def render(self, pretty=False):
+        """
+        Serializes the document once and keeps the bytes, which later body()
+        calls (e.g. one per appliance) then return as they are.
+        """
+        rendered = self._rendered.get(pretty)
+        if rendered is None:
+            rendered = self._rendered[pretty] = b''.join(self.body(pretty))
+        return rendered
+
+    def body(self, pretty=False, chunk_size=1 << 16):
+        """
+        Yields the serialized document as UTF-8 byte chunks of roughly
+        chunk_size bytes.
+        """
+        if pretty in self._rendered:
+            yield self._rendered[pretty]
+            return
+        out = _ChunkBuffer()
+        writer = EntityWriter(out, self.version, indent=2 if pretty else None, extra=self.extra)
+        writer.open()
+        for fragment in self.fragments:
+            if pretty:
+                writer.write(json.loads(fragment))
+            else:
+                writer.write_fragment(fragment)
+            if out.size >= chunk_size:
+                yield out.take()
+        writer.close()
+        yield out.take()
+
+
+class DocumentWriter(EntityWriter):
+    """
+    An EntityWriter that appends the entities to an EntityDocument instead
+    of writing JSON text, so that converted entities can be imported in the
+    same process. etype, if given, is the type of every entity written.
+    """
+
+    def __init__(self, document, etype=None):
+        EntityWriter.__init__(self, None, document.version, indent=None)
+        self.document = document
+        self.etype = etype
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, entity):
+        self.write_fragment(self.format(entity), getattr(entity, 'type', None) or self.etype)
+
+    def write_fragment(self, fragment, etype=None):
+        self.document.append_fragment(fragment, etype or self.etype)
+        self.count += 1
+
+    def write_fragments(self, fragments):
+        for fragment in fragments:
+            self.write_fragment(fragment)
+
+
+class _ChunkBuffer:
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+
+    def take(self):
+        data = ''.join(self.parts).encode('utf-8')
+        self.parts = []
+        self.size = 0
+        return data
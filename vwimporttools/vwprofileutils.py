@@ -0,0 +1,203 @@
+"""
+__license__ = 'https://www.apache.org/licenses/LICENSE-2.0'
+__copyright__ = 'Copyright (c) 2021 Virtual Instruments Corporation (d/b/a Virtana). All rights reserved.'
+"""
+
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_clock = time.perf_counter
+
+PROFILE_FORMATS = ('table', 'json')
+
+
+class CountedChunks:
+    """
+    Wraps an iterable request body, counting the bytes sent.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.size += len(chunk)
+            yield chunk
+
+
+class Profile:
+    """
+    Collects wall time per named stage and, per HTTP verb, request count,
+    latency, bytes sent and received, retries and errors. Stages may be
+    entered from several threads; the times of concurrent stages add up.
+
+    Instrumented code uses stage() around coarse steps, and iterate() and
+    wrap() around per-entity generators and calls. NULL_PROFILE has the same
+    methods but returns its arguments unchanged, so code instrumented for a
+    disabled profile runs exactly as it did before.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.requests = {}
+
+    def add_stage(self, name, seconds, calls=1):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0, 0.0]
+            stage[0] += calls
+            stage[1] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = _clock()
+        try:
+            yield
+        finally:
+            self.add_stage(name, _clock() - start)
+
+    def iterate(self, name, iterable):
+        """
+        Yields from iterable, adding the time spent producing each item to
+        stage name.
+        """
+        iterator = iter(iterable)
+        seconds = 0.0
+        calls = 0
+        try:
+            while True:
+                start = _clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += _clock() - start
+                    return
+                seconds += _clock() - start
+                calls += 1
+                yield item
+        finally:
+            self.add_stage(name, seconds, calls)
+
+    def wrap(self, name, func):
+        """
+        Returns func, adding the time of every call to stage name.
+        """
+        stage = self.add_stage
+
+        def timed(*args, **kwargs):
+            start = _clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage(name, _clock() - start)
+        return timed
+
+    def request(self, verb, seconds, sent=0, received=0, retries=0, ok=True):
+        with self.lock:
+            stats = self.requests.get(verb)
+            if stats is None:
+                stats = self.requests[verb] = {'latencies': [], 'sent': 0, 'received': 0, 'retries': 0, 'errors': 0}
+            stats['latencies'].append(seconds)
+            stats['sent'] += sent
+            stats['received'] += received
+            stats['retries'] += retries
+            stats['errors'] += not ok
+
+    def records(self):
+        """
+        Returns the collected statistics as a list of dicts, stages first.
+        """
+        records = [{'kind': 'stage', 'name': name, 'calls': calls, 'seconds': round(seconds, 6)}
+                   for name, (calls, seconds) in self.stages.items()]
+        for verb, stats in sorted(self.requests.items()):
+            latencies = sorted(stats['latencies'])
+            records.append({
+                'kind': 'request', 'verb': verb, 'count': len(latencies),
+                'seconds': round(sum(latencies), 6),
+                'p50': round(latencies[len(latencies) // 2], 6),
+                'p95': round(latencies[int(0.95 * (len(latencies) - 1))], 6),
+                'max': round(latencies[-1], 6),
+                'sent': stats['sent'], 'received': stats['received'],
+                'retries': stats['retries'], 'errors': stats['errors'],
+            })
+        return records
+
+    def report(self, fmt='table'):
+        """
+        Returns the statistics as a table, or as JSON lines if fmt is 'json'.
+        """
+        records = self.records()
+        if fmt == 'json':
+            return '\n'.join(json.dumps(r) for r in records)
+        lines = ['{:<24} {:>10} {:>12}'.format('stage', 'calls', 'seconds')]
+        for r in records:
+            if r['kind'] == 'stage':
+                lines.append('{:<24} {:>10} {:>12.3f}'.format(r['name'], r['calls'], r['seconds']))
+        if self.requests:
+            lines.append('')
+            lines.append('{:<7} {:>6} {:>9} {:>8} {:>8} {:>8} {:>12} {:>12} {:>7} {:>6}'.format(
+                'verb', 'count', 'total s', 'p50 ms', 'p95 ms', 'max ms', 'sent', 'received', 'retries', 'errors'))
+            for r in records:
+                if r['kind'] == 'request':
+                    lines.append('{:<7} {:>6} {:>9.3f} {:>8.1f} {:>8.1f} {:>8.1f} {:>12} {:>12} {:>7} {:>6}'.format(
+                        r['verb'], r['count'], r['seconds'], r['p50'] * 1000, r['p95'] * 1000, r['max'] * 1000,
+                        r['sent'], r['received'], r['retries'], r['errors']))
+        return '\n'.join(lines)
+
+
+class _NullProfile:
+    enabled = False
+    _stage = nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def iterate(self, name, iterable):
+        return iterable
+
+    def wrap(self, name, func):
+        return func
+
+    def add_stage(self, name, seconds, calls=1):
+        pass
+
+    def request(self, verb, seconds, sent=0, received=0, retries=0, ok=True):
+        pass
+
+
+NULL_PROFILE = _NullProfile()
+
+
+def cli_profile(fmt=None, cprofile_path=None):
+    """
+    Returns the profile for a CLI run: a Profile if fmt is set, otherwise
+    NULL_PROFILE. When the click command finishes (including through
+    exit()), the report is written to stderr and, if cprofile_path is set,
+    cProfile statistics for the whole run are dumped there for pstats or
+    snakeviz.
+    """
+    import click
+
+    profile = Profile() if fmt else NULL_PROFILE
+    profiler = None
+    if cprofile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if fmt:
+            click.echo(profile.report(fmt), err=True)
+
+    click.get_current_context().call_on_close(finish)
+    return profile
@@ -7,27 +7,282 @@ __version__ = '1.0'
 """
 
 
+import gzip
 import json
-import requests
+import random
+import threading
 import time
+import zlib
+from array import array
+from collections import namedtuple
+from itertools import repeat
+from operator import itemgetter
+from vwimporttools.vwprofileutils import NULL_PROFILE, CountedChunks
+
+# (connect, read) timeout in seconds applied to every request that does not
+# pass its own
+DEFAULT_TIMEOUT = (10, 300)
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+# imported by _requests() on first use, so that importing this module (e.g.
+# from the vwimport command group) does not load requests and urllib3
+requests = None
+
+
+def _requests():
+    global requests
+    if requests is None:
+        import requests.adapters
+    return requests
+
+
+def get_adapter(host, pool_maxsize=10, retries=3):
+    """
+    Returns the HTTPAdapter shared by every VWtokenutils instance talking to
+    host with the same pool size and retry count, so that keep-alive
+    connections are reused across instances. Idempotent verbs (GET, HEAD,
+    OPTIONS, DELETE) are retried on connection errors and 502/503/504
+    responses; POST and PUT are never retried, since the PUTs this module
+    sends (entitiesimport/commit, reports/reportBatch) are not idempotent.
+    """
+    from urllib3.util.retry import Retry
+    key = (host, pool_maxsize, retries)
+    with _adapters_lock:
+        if key not in _adapters:
+            retry = Retry(total=retries, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset(('GET', 'HEAD', 'OPTIONS', 'DELETE')),
+                          raise_on_status=False)
+            _adapters[key] = _requests().adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        return _adapters[key]
+
+
+# Columnar trend data for one metric: entities is the list of entity names,
+# and entity (an index into entities), timestamp and value are parallel
+# arrays with one element per sample.
+TrendColumns = namedtuple('TrendColumns', 'entities entity timestamp value')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def merge_trend_columns(columns):
+    """
+    Outer-joins the TrendColumns of several metrics, given as a dict of
+    metric -> TrendColumns, on (entity, timestamp). Returns a TrendColumns
+    whose value is a dict of metric -> array of values, NaN where a metric
+    has no sample for that row; rows are sorted by entity index, then
+    timestamp.
+    """
+    entities = []
+    index = {}
+    for c in columns.values():
+        for name in c.entities:
+            if name not in index:
+                index[name] = len(entities)
+                entities.append(name)
+
+    np = _numpy()
+    if np is not None:
+        parts = [np.asarray([index[n] for n in c.entities], dtype=np.int32)[np.asarray(c.entity, dtype=np.intp)]
+                 for c in columns.values()]
+        entity = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+        timestamp = np.concatenate([np.asarray(c.timestamp, dtype=np.int64) for c in columns.values()]) if parts else np.empty(0, dtype=np.int64)
+        order = np.lexsort((timestamp, entity))
+        entity, timestamp = entity[order], timestamp[order]
+        new_row = np.ones(len(order), dtype=bool)
+        new_row[1:] = (entity[1:] != entity[:-1]) | (timestamp[1:] != timestamp[:-1])
+        rows = np.empty(len(order), dtype=np.intp)
+        rows[order] = np.cumsum(new_row) - 1
+        values = {}
+        offset = 0
+        for metric, c in columns.items():
+            values[metric] = np.full(int(new_row.sum()), np.nan)
+            values[metric][rows[offset:offset + len(c.value)]] = c.value
+            offset += len(c.value)
+        return TrendColumns(entities, entity[new_row], timestamp[new_row], values)
+
+    keys = set()
+    for c in columns.values():
+        remap = [index[n] for n in c.entities]
+        keys.update(zip(map(remap.__getitem__, c.entity), c.timestamp))
+    keys = sorted(keys)
+    rows = {key: i for i, key in enumerate(keys)}
+    values = {}
+    for metric, c in columns.items():
+        remap = [index[n] for n in c.entities]
+        values[metric] = array('d', repeat(float('nan'), len(keys)))
+        for key, v in zip(zip(map(remap.__getitem__, c.entity), c.timestamp), c.value):
+            values[metric][rows[key]] = v
+    return TrendColumns(entities, array('i', map(itemgetter(0), keys)), array('q', map(itemgetter(1), keys)), values)
+
+
+class Poller:
+    """
+    Calls a function until it reports completion, sleeping between calls on
+    an exponential backoff schedule: initial, initial * factor, ... up to
+    cap seconds, each randomized by +/- jitter. If deadline (seconds) is set,
+    polling gives up once that much time has passed since the first call.
+
+    The latency of every call is recorded so that the schedule can be tuned;
+    see stats(). A Poller can be shared by several threads and event loops.
+    """
+
+    def __init__(self, initial=0.02, factor=2.0, cap=2.0, jitter=0.1, deadline=None):
+        self.initial = initial
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self.deadline = deadline
+        self.latencies = []
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+    def delays(self):
+        delay = self.initial
+        while True:
+            yield delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            delay = min(delay * self.factor, self.cap)
+
+    def waits(self, start=None):
+        """
+        Yields how long to sleep before each further call, following the
+        backoff schedule, and stops once the deadline (counted from start,
+        by default from the first wait) has passed. Time slept is added to
+        slept.
+        """
+        if start is None:
+            start = time.monotonic()
+        for delay in self.delays():
+            if self.deadline is not None:
+                remaining = self.deadline - (time.monotonic() - start)
+                if remaining <= 0:
+                    return
+                delay = min(delay, remaining)
+            with self._lock:
+                self.slept += delay
+            yield delay
+
+    def record(self, seconds):
+        """
+        Records the latency of one call.
+        """
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def run(self, func):
+        """
+        Polls func, which must return (done, value). Returns (True, value)
+        once func reports done, or (False, value) with the last value seen if
+        the deadline passes first.
+        """
+        waits = self.waits(time.monotonic())
+        while True:
+            before = time.monotonic()
+            done, value = func()
+            self.record(time.monotonic() - before)
+            if done:
+                return True, value
+            delay = next(waits, None)
+            if delay is None:
+                return False, value
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            slept = self.slept
+        if not latencies:
+            return {'polls': 0, 'slept': slept}
+        return {
+            'polls': len(latencies),
+            'slept': slept,
+            'min': latencies[0],
+            'mean': sum(latencies) / len(latencies),
+            'p95': latencies[int(0.95 * (len(latencies) - 1))],
+            'max': latencies[-1],
+        }
 
 
 class VWtokenutils:
     AUTHORIZATION_HEADER = { 'authorization' : 'bearer ' }
     CONTENT_TYPE_HEADER = { 'content-type' : 'application/json' }
 
-    def __init__(self, h, t):
-        requests.packages.urllib3.disable_warnings()
+    def __init__(self, h, t, poller=None, pool_maxsize=10, retries=3, timeout=DEFAULT_TIMEOUT, verify=False, cache=None,
+                 profile=None):
+        _requests().packages.urllib3.disable_warnings()
         self.session = requests.Session()
+        self.session.mount('https://{0}/'.format(h), get_adapter(h, pool_maxsize, retries))
         self.host = h
         self.token = t
-        self.AUTHORIZATION_HEADER.update({ 'authorization' : 'bearer ' + self.token })
+        self.timeout = timeout
+        self.verify = verify
+        self.poller = poller or Poller()
+        self.cache = cache
+        self.profile = profile or NULL_PROFILE
+        # per instance, so that clients for different appliances never share a token
+        self.AUTHORIZATION_HEADER = { 'authorization' : 'bearer ' + self.token }
+        self.JSON_HEADERS = dict(self.CONTENT_TYPE_HEADER, **self.AUTHORIZATION_HEADER)
+
+    @staticmethod
+    def compress_payload(payload, headers):
+        headers['content-encoding'] = 'gzip'
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if isinstance(payload, bytes):
+            return gzip.compress(payload, compresslevel=6)
+        return VWtokenutils.compress_chunks(payload)
+
+    @staticmethod
+    def compress_chunks(chunks):
+        # gzip-compresses an iterable of byte chunks as a stream
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
 
-    def get(self, endpoint, parameters=None):
+    def _count(self, payload):
+        # wraps a streamed body so that a profile can count the bytes sent
+        if self.profile.enabled and payload is not None and not isinstance(payload, (str, bytes)):
+            return CountedChunks(payload)
+        return payload
+
+    def _record(self, verb, start, payload, r):
+        profile = self.profile
+        if not profile.enabled:
+            return
+        seconds = time.perf_counter() - start
+        if payload is None:
+            sent = 0
+        elif isinstance(payload, CountedChunks):
+            sent = payload.size
+        elif isinstance(payload, str):
+            sent = len(payload.encode('utf-8'))
+        else:
+            sent = len(payload)
+        if r is None:
+            profile.request(verb, seconds, sent, ok=False)
+            return
+        retries = getattr(r.raw, 'retries', None)
+        profile.request(verb, seconds, sent, len(r.content), len(retries.history) if retries is not None else 0,
+                        r.status_code == 200)
+
+    def get(self, endpoint, parameters=None, timeout=None):
+        start = time.perf_counter()
         try:
-            r = self.session.get('https://{0}{1}'.format(self.host, endpoint), headers=self.AUTHORIZATION_HEADER, params=parameters, verify=False)
+            r = self.session.get('https://{0}{1}'.format(self.host, endpoint), headers=self.AUTHORIZATION_HEADER, params=parameters, verify=self.verify, timeout=timeout or self.timeout)
         except requests.exceptions.RequestException as errr:
+            self._record('GET', start, None, None)
             return False, "An exception was caught connecting to VW. {}".format(errr)
+        self._record('GET', start, None, r)
 
         try:
             val = r.json()
@@ -43,13 +298,19 @@ class VWtokenutils:
             else:
                 return False, "GET to {} failed with status_code {} ({})".format(endpoint, r.status_code, val)
 
-    def put(self, endpoint, payload=None, parameters=None):
-        headers = self.CONTENT_TYPE_HEADER.copy()
-        headers.update(self.AUTHORIZATION_HEADER)
+    def put(self, endpoint, payload=None, parameters=None, compress=False, timeout=None):
+        headers = self.JSON_HEADERS
+        if compress and payload is not None:
+            headers = headers.copy()
+            payload = self.compress_payload(payload, headers)
+        payload = self._count(payload)
+        start = time.perf_counter()
         try:
-            r = self.session.put('https://{0}{1}'.format(self.host, endpoint), data=payload, params=parameters, verify=False, headers=headers)
+            r = self.session.put('https://{0}{1}'.format(self.host, endpoint), data=payload, params=parameters, verify=self.verify, timeout=timeout or self.timeout, headers=headers)
         except requests.exceptions.RequestException as errr:
+            self._record('PUT', start, payload, None)
             return False, "An exception was caught connecting to VW. {}".format(errr)
+        self._record('PUT', start, payload, r)
 
         try:
             val = r.json()
@@ -65,13 +326,19 @@ class VWtokenutils:
             else:
                 return False, "PUT to {} failed with status_code {} ({})".format(endpoint, r.status_code, val)
 
-    def post(self, endpoint, payload, timeout=None):
-        headers = self.CONTENT_TYPE_HEADER.copy()
-        headers.update(self.AUTHORIZATION_HEADER)
+    def post(self, endpoint, payload, timeout=None, compress=False):
+        headers = self.JSON_HEADERS
+        if compress:
+            headers = headers.copy()
+            payload = self.compress_payload(payload, headers)
+        payload = self._count(payload)
+        start = time.perf_counter()
         try:
-            r = self.session.post('https://{0}{1}'.format(self.host, endpoint), data=payload, verify=False, timeout=timeout, headers=headers)
+            r = self.session.post('https://{0}{1}'.format(self.host, endpoint), data=payload, verify=self.verify, timeout=timeout or self.timeout, headers=headers)
         except requests.exceptions.RequestException as errr:
+            self._record('POST', start, payload, None)
             return False, "An exception was caught connecting to VW. {}".format(errr)
+        self._record('POST', start, payload, r)
 
         try:
             val = r.json()
@@ -87,13 +354,15 @@ class VWtokenutils:
             else:
                 return False, "POST to {} failed with status_code {} ({})".format(endpoint, r.status_code, val)
 
-    def delete(self, endpoint, payload=None, parameters=None):
-        headers = self.CONTENT_TYPE_HEADER.copy()
-        headers.update(self.AUTHORIZATION_HEADER)
+    def delete(self, endpoint, payload=None, parameters=None, timeout=None):
+        payload = self._count(payload)
+        start = time.perf_counter()
         try:
-            r = self.session.delete('https://{0}{1}'.format(self.host, endpoint), data=payload, params=parameters, verify=False, headers=headers)
+            r = self.session.delete('https://{0}{1}'.format(self.host, endpoint), data=payload, params=parameters, verify=self.verify, timeout=timeout or self.timeout, headers=self.JSON_HEADERS)
         except requests.exceptions.RequestException as errr:
+            self._record('DELETE', start, payload, None)
             return False, "An exception was caught connecting to VW. {}".format(errr)
+        self._record('DELETE', start, payload, r)
 
         try:
             val = r.json()
@@ -142,6 +411,46 @@ class VWtokenutils:
 
         return entity_metrics
 
+    @staticmethod
+    def process_topxtrend_columns(entity_metrics, results_data, metric, entity_type):
+        """
+        Columnar alternative to process_topxtrend_data: stores a TrendColumns
+        under entity_metrics[metric] instead of one dict per sample. The
+        arrays are NumPy arrays when NumPy is installed, array.array
+        otherwise; missing values are NaN and float timestamps are truncated
+        to integer milliseconds.
+        """
+        entities = []
+        entity = array('i')
+        timestamp = array('q')
+        value = array('d')
+        for i, result in enumerate(results_data):
+            data = result['data']
+            entities.append(result['entityName'])
+            entity.extend(repeat(i, len(data)))
+            start = len(timestamp)
+            try:
+                timestamp.extend(map(itemgetter(0), data))
+            except TypeError:
+                del timestamp[start:]
+                timestamp.extend(int(d[0]) for d in data)
+            start = len(value)
+            try:
+                value.extend(map(itemgetter(1), data))
+            except TypeError:
+                del value[start:]
+                value.extend(float('nan') if d[1] is None else d[1] for d in data)
+
+        np = _numpy()
+        if np is not None:
+            # zero-copy views of the array.array buffers
+            entity = np.frombuffer(entity, dtype=np.intc)
+            timestamp = np.frombuffer(timestamp, dtype=np.int64)
+            value = np.frombuffer(value, dtype=np.float64)
+        entity_metrics[metric] = TrendColumns(entities, entity, timestamp, value)
+
+        return entity_metrics
+
     @staticmethod
     def process_histogram_data(entity_metrics, results_data, metric, entity_type):
 
@@ -150,24 +459,44 @@ class VWtokenutils:
 
         return entity_metrics
 
-    def get_data(self, payload):
+    def get_report(self, payload):
+        """
+        Runs one report and returns (True, the raw reportPoll result) or
+        (False, error).
+        """
         rc, uuid = self.put('/api/v1/reports/reportBatch', json.dumps(payload))
         if not rc:
             return False, 'reportBatch request failed ({})'.format(uuid)
-        data_recvd = False
         parameters = { 'uuid' : uuid }
-        while not data_recvd:
+
+        def report_finished():
             rc, res = self.get('/api/v1/reports/reportPoll', parameters)
-            if rc and 'finished' in res and res['finished']:
-                data_recvd = True
-            else:
-                time.sleep(1)
+            return rc and 'finished' in res and res['finished'], res
+
+        data_recvd, res = self.poller.run(report_finished)
+        if not data_recvd:
+            return False, 'reportPoll did not finish within {} seconds'.format(self.poller.deadline)
+        return True, res
+
+    def get_data(self, payload, columnar=False):
+        """
+        Runs one report and returns (True, entity_metrics) or (False, error).
+        With columnar=True, chart types that support it (topxtrend) return
+        TrendColumns instead of nested dicts.
+        """
+        rc, res = self.get_report(payload)
+        if not rc:
+            return False, res
+        return self.process_report(payload, res, columnar)
+
+    def process_report(self, payload, res, columnar=False):
         if 'charts' in res and len(res['charts']) > 0:
             result_data = res['charts'][0]['chartData']
         else:
             result_data = []
         entity_metrics = {}
-        entity_metrics = getattr(self, 'process_' + payload['chartType'] + '_data')(entity_metrics, result_data, payload['metricName'], payload['entityType'])
+        suffix = '_columns' if columnar and hasattr(self, 'process_' + payload['chartType'] + '_columns') else '_data'
+        entity_metrics = getattr(self, 'process_' + payload['chartType'] + suffix)(entity_metrics, result_data, payload['metricName'], payload['entityType'])
 
         if len(entity_metrics) > 0:
             return True, entity_metrics
@@ -175,6 +504,16 @@ class VWtokenutils:
             return False, 'No data returned for request'
 
     def get_entities(self, kind, filterType='EXACT_MATCH', filterText=None):
+        """
+        Returns (True, list of entity property dicts) or (False, error). If
+        the instance has an EntityCache, results are served from and stored
+        in it.
+        """
+        key = (self.host, kind, filterType if filterText else None, filterText)
+        if self.cache is not None:
+            entities = self.cache.get(key)
+            if entities is not None:
+                return True, [dict(e) for e in entities]
         parameters = {'type' : kind}
         if filterText:
             parameters['filterText'] = filterText
@@ -183,4 +522,16 @@ class VWtokenutils:
         if not status_code:
             return False, 'Could not get entities of type {} ({})'.format(kind, status_str)
         else:
-            return True, [{x['id'] : x['value'] for x in e['properties']} for e in status_str]
+            entities = [{x['id'] : x['value'] for x in e['properties']} for e in status_str]
+            if self.cache is not None:
+                self.cache.put(key, entities)
+                entities = [dict(e) for e in entities]
+            return True, entities
+
+    def invalidate_entities(self):
+        """
+        Drops cached get_entities results for this appliance; call after the
+        appliance's entities change, e.g. after an import is committed.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.host)